@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Substituto local dos endpoints da Batch API da OpenAI, para testar o modo
+batch (pipeline/batch.py) sem esperar horas nem pagar pelo batch real.
+
+Cada batch recebido é processado em segundo plano: as requisições do arquivo
+de entrada são enviadas uma a uma à API de chat completions (a configurada em
+OPENAI_BASE_URL/OPENAI_API_KEY) e o resultado vira um arquivo de saída no
+mesmo formato da Batch API. --delay simula a espera antes do processamento.
+
+Uso: python3 batch_server.py [--host 127.0.0.1] [--port 8100] [--delay 0]
+     UML_BATCH_BASE_URL=http://127.0.0.1:8100/v1 python3 pipeline/batch.py corpus/
+
+Endpoints:
+  POST /v1/files                   envia um arquivo (multipart: file, purpose)
+  GET  /v1/files/<id>              metadados do arquivo
+  GET  /v1/files/<id>/content      conteúdo do arquivo
+  POST /v1/batches                 cria um batch ({"input_file_id", "endpoint", "completion_window"})
+  GET  /v1/batches/<id>            status do batch
+  POST /v1/batches/<id>/cancel     cancela um batch ainda não concluído
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+
+load_dotenv()
+
+upstream = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+files = {}
+batches = {}
+lock = threading.Lock()
+delay = 0.0
+
+
+def new_id(prefix):
+    return f"{prefix}-{uuid.uuid4().hex[:24]}"
+
+
+def store_file(content, filename, purpose):
+    file_id = new_id("file")
+    with lock:
+        files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+            "content": content,
+        }
+    return files[file_id]
+
+
+def public(file):
+    return {k: v for k, v in file.items() if k != "content"}
+
+
+def set_status(batch, status, **fields):
+    with lock:
+        batch["status"] = status
+        batch[f"{status}_at"] = int(time.time())
+        batch.update(fields)
+
+
+def process_batch(batch):
+    """Executa as requisições do batch e grava os arquivos de saída e de erro."""
+    time.sleep(delay)
+    if batch["status"] == "cancelling":
+        return set_status(batch, "cancelled")
+    set_status(batch, "in_progress")
+
+    lines = files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+    requests = [json.loads(line) for line in lines if line.strip()]
+    batch["request_counts"]["total"] = len(requests)
+
+    output, errors = [], []
+    for request in requests:
+        if batch["status"] == "cancelling":
+            break
+        entry = {"id": new_id("batch_req"), "custom_id": request.get("custom_id")}
+        try:
+            if request.get("url") != batch["endpoint"]:
+                raise ValueError(f"url {request.get('url')} does not match the batch endpoint")
+            response = upstream.chat.completions.create(**request["body"])
+            entry.update(response={"status_code": 200, "request_id": entry["id"], "body": response.model_dump()},
+                         error=None)
+            output.append(entry)
+            batch["request_counts"]["completed"] += 1
+        except Exception as e:
+            entry.update(response=None, error={"code": type(e).__name__, "message": str(e)})
+            errors.append(entry)
+            batch["request_counts"]["failed"] += 1
+
+    fields = {}
+    if output:
+        fields["output_file_id"] = store_file(
+            "".join(json.dumps(e) + "\n" for e in output).encode("utf-8"), "batch_output.jsonl", "batch_output"
+        )["id"]
+    if errors:
+        fields["error_file_id"] = store_file(
+            "".join(json.dumps(e) + "\n" for e in errors).encode("utf-8"), "batch_errors.jsonl", "batch_output"
+        )["id"]
+    set_status(batch, "cancelled" if batch["status"] == "cancelling" else "completed", **fields)
+
+
+def run_batch(batch):
+    try:
+        process_batch(batch)
+    except Exception as e:
+        traceback.print_exc()
+        set_status(batch, "failed", errors={"data": [{"code": type(e).__name__, "message": str(e)}]})
+
+
+class BatchHandler(BaseHTTPRequestHandler):
+    server_version = "UMLBatchStandIn/1.0"
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": {"message": message, "type": "invalid_request_error"}})
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def route(self):
+        return [p for p in self.path.split("?")[0].split("/") if p]
+
+    def do_POST(self):
+        parts = self.route()
+        if parts == ["v1", "files"]:
+            return self.upload_file()
+        if parts == ["v1", "batches"]:
+            return self.create_batch()
+        if len(parts) == 4 and parts[:2] == ["v1", "batches"] and parts[3] == "cancel":
+            batch = batches.get(parts[2])
+            if batch is None:
+                return self.send_error_json(404, f"batch '{parts[2]}' not found")
+            if batch["status"] not in ("completed", "failed", "cancelled", "expired"):
+                set_status(batch, "cancelling")
+            return self.send_json(200, batch)
+        self.send_error_json(404, "not found")
+
+    def upload_file(self):
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/form-data"):
+            return self.send_error_json(400, "expected multipart/form-data")
+
+        # O corpo multipart é lido como uma mensagem MIME
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + self.read_body()
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+
+        if "file" not in fields:
+            return self.send_error_json(400, "missing 'file' field")
+        filename, content = fields["file"]
+        purpose = fields.get("purpose", (None, b""))[1].decode("utf-8")
+        self.send_json(200, public(store_file(content, filename or "upload.jsonl", purpose)))
+
+    def create_batch(self):
+        try:
+            data = json.loads(self.read_body() or b"{}")
+        except ValueError:
+            return self.send_error_json(400, "invalid JSON body")
+        if data.get("input_file_id") not in files:
+            return self.send_error_json(400, f"input file '{data.get('input_file_id')}' not found")
+
+        batch_id = new_id("batch")
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": data.get("endpoint", "/v1/chat/completions"),
+            "errors": None,
+            "input_file_id": data["input_file_id"],
+            "completion_window": data.get("completion_window", "24h"),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": data.get("metadata"),
+        }
+        with lock:
+            batches[batch_id] = batch
+        threading.Thread(target=run_batch, args=(batch,), daemon=True).start()
+        self.send_json(200, batch)
+
+    def do_GET(self):
+        parts = self.route()
+        if len(parts) == 3 and parts[:2] == ["v1", "batches"]:
+            batch = batches.get(parts[2])
+            if batch is None:
+                return self.send_error_json(404, f"batch '{parts[2]}' not found")
+            with lock:
+                return self.send_json(200, batch)
+
+        if len(parts) in (3, 4) and parts[:2] == ["v1", "files"]:
+            file = files.get(parts[2])
+            if file is None:
+                return self.send_error_json(404, f"file '{parts[2]}' not found")
+            if len(parts) == 3:
+                return self.send_json(200, public(file))
+            if parts[3] == "content":
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(file["content"])))
+                self.end_headers()
+                return self.wfile.write(file["content"])
+
+        self.send_error_json(404, "not found")
+
+    def log_message(self, format, *args):
+        print(f"[HTTP] {self.address_string()} {format % args}")
+
+
+def main():
+    global delay
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds each batch waits before running")
+    args = parser.parse_args()
+    delay = args.delay
+
+    server = ThreadingHTTPServer((args.host, args.port), BatchHandler)
+    print(f"=== BATCH API STAND-IN on http://{args.host}:{args.port}/v1 ===")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n=== STAND-IN STOPPED ===")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Avaliação A/B de duas variantes do pipeline (prompt ou modelo) sobre um corpus,
+com parada antecipada por teste sequencial.
+
+Cada variante é uma cópia do diretório pipeline/ com alguns módulos trocados
+(ex.: --b classes=experimentos/classes_v2.py) e/ou outro modelo (--b-model).
+Os casos do corpus são executados em pares intercalados (A e B no mesmo caso,
+alternando a ordem) e, a cada par concluído, o vencedor pelo overall_score
+alimenta um SPRT (teste sequencial da razão de probabilidades de Wald) sobre
+a taxa de vitórias:
+
+  H0: p = 0.5 (nenhuma variante é melhor)
+  H1: p = 0.5 + delta, em cada direção (A melhor ou B melhor)
+
+A avaliação para assim que uma das direções é significativa ou quando as duas
+aceitam H0 (futilidade: a diferença, se existe, é menor que delta). Empates
+(diferença <= --tie-margin) valem meia vitória para cada lado. O relatório
+informa a decisão, a confiança e quantas chamadas à LLM deixaram de ser feitas
+em relação ao corpus inteiro.
+
+Uso: python3 pipeline/abtest.py corpus/ --b classes=experimentos/classes_v2.py
+     python3 pipeline/abtest.py corpus/ --a-model gpt-4o-mini --b-model gpt-4o
+     (cada subdiretório de corpus/ com um study_case.txt é um caso)
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+
+RUN_FILE = "abtest_run.json"
+REPORT_FILE = "abtest_report.json"
+DEFAULT_OUTPUT = "abtest"
+
+# Erros tipo I (total, dividido entre as duas direções) e tipo II do SPRT
+ALPHA = 0.05
+BETA = 0.2
+# Menor vantagem relevante na taxa de vitórias (H1: p = 0.5 + DELTA)
+DELTA = 0.2
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def find_cases(corpus):
+    return [
+        os.path.join(corpus, name) for name in sorted(os.listdir(corpus))
+        if os.path.isfile(os.path.join(corpus, name, "study_case.txt"))
+    ]
+
+
+class SequentialTest:
+    """SPRT bilateral sobre vitórias pareadas (B contra A)."""
+
+    def __init__(self, alpha=ALPHA, beta=BETA, delta=DELTA):
+        self.alpha, self.beta, self.delta = alpha, beta, delta
+        p1 = 0.5 + delta
+        # Razão de log-verossimilhança por vitória / derrota da direção testada
+        self.win_step = math.log(p1 / 0.5)
+        self.loss_step = math.log((1 - p1) / 0.5)
+        self.upper = math.log((1 - beta) / (alpha / 2))
+        self.lower = math.log(beta / (1 - alpha / 2))
+        self.wins = {"a": 0, "b": 0}
+        self.ties = 0
+
+    def add(self, score_a, score_b, tie_margin=0.0):
+        if abs(score_b - score_a) <= tie_margin:
+            self.ties += 1
+        elif score_b > score_a:
+            self.wins["b"] += 1
+        else:
+            self.wins["a"] += 1
+
+    def llr(self, side):
+        # Empate conta meia vitória para cada lado: aproxima as duas direções de H0
+        other = "a" if side == "b" else "b"
+        wins = self.wins[side] + self.ties / 2
+        losses = self.wins[other] + self.ties / 2
+        return wins * self.win_step + losses * self.loss_step
+
+    def decision(self):
+        """"a", "b" (variante melhor), "no_difference" (futilidade) ou None (continuar)."""
+        for side in ("a", "b"):
+            if self.llr(side) >= self.upper:
+                return side
+        if self.llr("a") <= self.lower and self.llr("b") <= self.lower:
+            return "no_difference"
+        return None
+
+    def confidence(self, decision):
+        if decision in ("a", "b"):
+            return 1 - self.alpha
+        if decision == "no_difference":
+            return 1 - self.beta
+        return None
+
+    def p_value(self):
+        """Teste do sinal bilateral exato sobre as vitórias observadas (informativo)."""
+        n = self.wins["a"] + self.wins["b"]
+        if n == 0:
+            return 1.0
+        k = min(self.wins.values())
+        tail = sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n
+        return min(1.0, 2 * tail)
+
+
+def parse_overrides(specs):
+    """["classes=x/classes_v2.py", "y/verify.py"] -> {"classes.py": "x/classes_v2.py", "verify.py": ...}"""
+    overrides = {}
+    for spec in specs or []:
+        module, _, path = spec.rpartition("=")
+        module = module or os.path.splitext(os.path.basename(path))[0]
+        if not os.path.isfile(path):
+            raise ValueError(f"override file '{path}' not found")
+        if not os.path.isfile(os.path.join(PIPELINE_DIR, f"{module}.py")):
+            raise ValueError(f"'{module}' is not a pipeline module")
+        overrides[f"{module}.py"] = path
+    return overrides
+
+
+def build_variant(variant_dir, overrides):
+    """Copia o pipeline para variant_dir e troca os módulos indicados."""
+    if os.path.exists(variant_dir):
+        shutil.rmtree(variant_dir)
+    shutil.copytree(PIPELINE_DIR, variant_dir, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+    for name, path in overrides.items():
+        shutil.copyfile(path, os.path.join(variant_dir, name))
+
+
+def run_variant(variant_dir, case, data_dir, model=None):
+    """Executa o pipeline da variante sobre um caso. Retorna o resumo gravado pelo worker ou None."""
+    if os.path.exists(data_dir):
+        shutil.rmtree(data_dir)
+    os.makedirs(data_dir)
+    shutil.copyfile(os.path.join(case, "study_case.txt"), os.path.join(data_dir, "study_case.txt"))
+
+    # O worker roda a partir da cópia da variante, então importa os módulos dela
+    command = [sys.executable, os.path.join(variant_dir, "abtest.py"), "--worker", data_dir]
+    if model:
+        command += ["--model", model]
+    result = subprocess.run(command, capture_output=True, text=True)
+    with open(os.path.join(data_dir, "output.log"), "w", encoding="utf-8") as f:
+        f.write(result.stdout + result.stderr)
+
+    if result.returncode != 0:
+        last = (result.stderr.strip().splitlines() or ["no output"])[-1]
+        print(f"[ERROR] {os.path.basename(variant_dir)} failed on {case}: {last}")
+        return None
+    with open(os.path.join(data_dir, RUN_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def worker(data_dir, model=None):
+    """Uma execução completa do pipeline (chamada pela própria cópia da variante)."""
+    from routing import call_cost
+    from runner import run_stages
+    from utils import llm_session
+
+    started = time.time()
+    with llm_session(model) as calls:
+        pipeline_model = run_stages(data_dir)
+    summary = {
+        "overall_score": pipeline_model.report["scoring"]["overall_score"],
+        "calls": len(calls),
+        "cost_usd": round(sum(call_cost(call) for call in calls), 6),
+        "seconds": round(time.time() - started, 3),
+    }
+    with open(os.path.join(data_dir, RUN_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def evaluate(corpus, variants, output=DEFAULT_OUTPUT, max_pairs=None, tie_margin=0.0,
+             alpha=ALPHA, beta=BETA, delta=DELTA, seed=0):
+    """
+    Executa pares A/B intercalados até o SPRT decidir ou os pares acabarem.
+
+    Args:
+        variants: {"a": {"overrides": {...}, "model": ...}, "b": {...}}
+        max_pairs: máximo de pares (padrão: um por caso; acima disso os casos se repetem)
+
+    Returns:
+        o relatório (mesmo conteúdo de abtest_report.json)
+    """
+    cases = find_cases(corpus)
+    if not cases:
+        raise ValueError(f"no cases (subdirectories with study_case.txt) in '{corpus}'")
+    max_pairs = max_pairs or len(cases)
+    # Ordem aleatória (reprodutível): a parada antecipada não deve depender da ordem alfabética
+    order = list(cases)
+    random.Random(seed).shuffle(order)
+
+    for side, variant in variants.items():
+        build_variant(os.path.join(output, "variants", side), variant["overrides"])
+
+    test = SequentialTest(alpha, beta, delta)
+    pairs, failed = [], 0
+    started = time.time()
+    print(f"=== A/B EVALUATION: up to {max_pairs} pair(s) from {len(cases)} case(s) ===")
+
+    decision = None
+    for index in range(max_pairs):
+        case = order[index % len(order)]
+        run_dir = os.path.join(output, "runs", f"{index + 1:04d}-{os.path.basename(case)}")
+        # Alterna quem roda primeiro, para que deriva da API não favoreça uma variante
+        sides = ("a", "b") if index % 2 == 0 else ("b", "a")
+        results = {}
+        for side in sides:
+            results[side] = run_variant(os.path.join(output, "variants", side), case,
+                                        os.path.join(run_dir, side), variants[side]["model"])
+        if None in results.values():
+            failed += 1
+            pairs.append({"case": case, "failed": True, **results})
+            continue
+
+        score_a, score_b = results["a"]["overall_score"], results["b"]["overall_score"]
+        test.add(score_a, score_b, tie_margin)
+        pairs.append({"case": case, **results})
+        print(f"[PAIR {index + 1}] {os.path.basename(case)}: A {score_a} x B {score_b} | "
+              f"wins A {test.wins['a']} B {test.wins['b']} ties {test.ties} | "
+              f"LLR A {test.llr('a'):.2f} B {test.llr('b'):.2f}")
+
+        decision = test.decision()
+        if decision is not None:
+            break
+
+    runs = [r for pair in pairs for r in (pair["a"], pair["b"]) if r is not None]
+    calls = sum(r["calls"] for r in runs)
+    cost = sum(r["cost_usd"] for r in runs)
+    # Economia estimada pela média por execução nos pares que não precisaram rodar
+    remaining_runs = 2 * (max_pairs - len(pairs))
+    calls_per_run = calls / len(runs) if runs else 0.0
+    cost_per_run = cost / len(runs) if runs else 0.0
+
+    completed = [p for p in pairs if not p.get("failed")]
+    mean = {
+        side: round(sum(p[side]["overall_score"] for p in completed) / len(completed), 2) if completed else None
+        for side in ("a", "b")
+    }
+    report = {
+        "decision": {"a": "A is better", "b": "B is better", "no_difference": "no meaningful difference",
+                     None: "inconclusive (pairs exhausted)"}[decision],
+        "winner": decision if decision in ("a", "b") else None,
+        "confidence": test.confidence(decision),
+        "sprt": {
+            "alpha": alpha, "beta": beta, "delta": delta,
+            "upper_bound": round(test.upper, 4), "lower_bound": round(test.lower, 4),
+            "llr_a": round(test.llr("a"), 4), "llr_b": round(test.llr("b"), 4),
+        },
+        "sign_test_p_value": round(test.p_value(), 6),
+        "wins": test.wins,
+        "ties": test.ties,
+        "mean_score": mean,
+        "pairs": len(pairs),
+        "failed_pairs": failed,
+        "max_pairs": max_pairs,
+        "llm_calls": calls,
+        "llm_calls_saved": round(remaining_runs * calls_per_run),
+        "cost_usd": round(cost, 6),
+        "cost_saved_usd": round(remaining_runs * cost_per_run, 6),
+        "wall_seconds": round(time.time() - started, 3),
+        "variants": {
+            side: {"overrides": variant["overrides"], "model": variant["model"]}
+            for side, variant in variants.items()
+        },
+        "runs": pairs,
+    }
+    with open(os.path.join(output, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"\n=== A/B DECISION: {report['decision']} ===")
+    if report["confidence"] is not None:
+        print(f"Confidence: {report['confidence']:.0%}")
+    print(f"Pairs: {len(pairs)}/{max_pairs} | wins A {test.wins['a']} B {test.wins['b']} ties {test.ties} | "
+          f"mean score A {mean['a']} B {mean['b']} | sign test p = {report['sign_test_p_value']:.4f}")
+    print(f"LLM calls: {calls} made, ~{report['llm_calls_saved']} saved "
+          f"(${report['cost_saved_usd']:.4f} of ~${report['cost_saved_usd'] + cost:.4f} for all pairs)")
+    print(f"Report: {os.path.join(output, REPORT_FILE)}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A/B evaluation of two pipeline variants with sequential early stopping")
+    parser.add_argument("corpus", nargs="?", help="directory with one subdirectory (containing study_case.txt) per case")
+    parser.add_argument("--a", nargs="*", default=[], metavar="[MODULE=]FILE",
+                        help="pipeline modules replaced in variant A (default: current pipeline)")
+    parser.add_argument("--b", nargs="*", default=[], metavar="[MODULE=]FILE",
+                        help="pipeline modules replaced in variant B (e.g. classes=experiments/classes_v2.py)")
+    parser.add_argument("--a-model", help="LLM model for variant A")
+    parser.add_argument("--b-model", help="LLM model for variant B")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"output directory (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--max-pairs", type=int, help="maximum pairs to run (default: one per case)")
+    parser.add_argument("--tie-margin", type=float, default=0.0,
+                        help="score differences up to this value count as ties")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help=f"false positive rate (default: {ALPHA})")
+    parser.add_argument("--beta", type=float, default=BETA, help=f"false negative rate (default: {BETA})")
+    parser.add_argument("--delta", type=float, default=DELTA,
+                        help=f"smallest relevant win-rate advantage over 0.5 (default: {DELTA})")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the case order")
+    parser.add_argument("--worker", metavar="DATA_DIR", help=argparse.SUPPRESS)
+    parser.add_argument("--model", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.model)
+        return
+
+    if not args.corpus or not os.path.isdir(args.corpus):
+        print(f"[ERROR] corpus directory '{args.corpus}' not found")
+        sys.exit(1)
+    try:
+        variants = {
+            "a": {"overrides": parse_overrides(args.a), "model": args.a_model},
+            "b": {"overrides": parse_overrides(args.b), "model": args.b_model},
+        }
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    if variants["a"] == variants["b"]:
+        print("[ERROR] variants A and B are identical; pass --a/--b overrides or --a-model/--b-model")
+        sys.exit(1)
+    if not 0 < args.delta < 0.5:
+        print("[ERROR] --delta must be between 0 and 0.5")
+        sys.exit(1)
+
+    evaluate(args.corpus, variants, args.output, args.max_pairs, args.tie_margin,
+             args.alpha, args.beta, args.delta, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Agregação de muitos score_report.json em um único resumo, com memória constante.
+
+Cada relatório é lido uma única vez e reduzido a contadores: histogramas de
+score (resolução 0,1 ponto, de onde saem os percentis), frequência de tipos de
+erro por seção, histograma de notas e um heap com os k piores casos. Nenhuma
+lista de relatórios é mantida, então a memória não cresce com o corpus.
+
+Entradas aceitas: arquivos score_report.json, diretórios (buscados
+recursivamente por score_report.json), arquivos .jsonl com um relatório por
+linha e arquivos de execuções (ver archive.py). Corpora grandes são lidos em
+vários processos; cada um devolve um Aggregate parcial que é combinado no final.
+"""
+
+import heapq
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from itertools import chain, islice
+
+from archive import Archive, is_archive
+
+
+REPORT_NAME = "score_report.json"
+# Resolução do histograma de scores: 1001 baldes de 0,1 ponto (0.0 a 100.0)
+BINS_PER_POINT = 10
+TOP_K = 10
+GRADES = ["A", "B", "C", "D", "F"]
+
+# Abaixo destes tamanhos a leitura é feita no próprio processo
+PARALLEL_MIN_FILES = 200
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+FILES_PER_TASK = 64
+
+
+class Histogram:
+    """Distribuição de scores (0-100) em baldes fixos, com estatísticas em uma passada."""
+
+    def __init__(self):
+        self.bins = [0] * (100 * BINS_PER_POINT + 1)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        value = min(100.0, max(0.0, float(value)))
+        self.bins[int(round(value * BINS_PER_POINT))] += 1
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for i, n in enumerate(other.bins):
+            self.bins[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, int(-(-p * self.count // 100)))  # ceil(p% de count)
+        seen = 0
+        for i, n in enumerate(self.bins):
+            seen += n
+            if seen >= rank:
+                return i / BINS_PER_POINT
+        return self.max
+
+    def buckets(self, width=10):
+        """Contagens em faixas de `width` pontos (a última inclui o 100)."""
+        result = {}
+        for start in range(0, 100, width):
+            end = start + width
+            last = len(self.bins) if end == 100 else end * BINS_PER_POINT
+            result[f"{start}-{end}"] = sum(self.bins[start * BINS_PER_POINT:last])
+        return result
+
+    def stats(self):
+        if not self.count:
+            return {"count": 0}
+        mean = self.total / self.count
+        variance = max(0.0, self.total_sq / self.count - mean * mean)
+        return {
+            "count": self.count,
+            "mean": round(mean, 2),
+            "stdev": round(variance ** 0.5, 2),
+            "min": self.min,
+            "max": self.max,
+            "p10": self.percentile(10),
+            "p25": self.percentile(25),
+            "p50": self.percentile(50),
+            "p75": self.percentile(75),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": self.buckets(),
+        }
+
+
+class Aggregate:
+    """Acumuladores de passada única sobre os relatórios de um corpus."""
+
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.runs = 0
+        self.invalid = 0
+        self.passed = 0
+        self.overall = Histogram()
+        self.sections = {}      # seção -> Histogram
+        self.error_types = {}   # seção -> {tipo: quantidade}
+        self.runs_with_error = {}  # seção -> execuções com ao menos um erro
+        self.grades = {grade: 0 for grade in GRADES}
+        # Heap de mínimo por -score: a raiz é o "melhor dos piores" e sai primeiro.
+        # O contador desempata scores iguais sem comparar o restante da entrada
+        self.worst = []
+        self.pushed = 0
+
+    def add(self, run_id, report):
+        # Relatório malformado (chave ausente, tipo errado) é ignorado por inteiro
+        try:
+            scoring = report["scoring"]
+            overall = float(scoring["overall_score"])
+            summary = scoring.get("summary") or {}
+            if not isinstance(summary, dict):
+                raise TypeError("summary is not an object")
+            grade = scoring.get("grade", "F")
+            if not isinstance(grade, str):
+                raise TypeError("grade is not a string")
+            passed = bool(summary.get("passed", overall >= 60.0))
+            total_errors = int(summary.get("total_errors") or 0)
+            sections = {}
+            for section, data in (scoring.get("section_scores") or {}).items():
+                breakdown = data.get("error_breakdown") or {}
+                sections[section] = (
+                    float(data["score"]),
+                    {error_type: int(info.get("count", 0)) for error_type, info in breakdown.items()},
+                )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            self.invalid += 1
+            return
+
+        self.runs += 1
+        self.overall.add(overall)
+        self.grades[grade] = self.grades.get(grade, 0) + 1
+        if passed:
+            self.passed += 1
+
+        for section, (score, breakdown) in sections.items():
+            self.sections.setdefault(section, Histogram()).add(score)
+            if breakdown:
+                self.runs_with_error[section] = self.runs_with_error.get(section, 0) + 1
+            counts = self.error_types.setdefault(section, {})
+            for error_type, n in breakdown.items():
+                counts[error_type] = counts.get(error_type, 0) + n
+
+        self.push_worst(overall, run_id, grade, total_errors)
+
+    def push_worst(self, score, run_id, grade, total_errors):
+        # run_id pode ser int (JSONL) ou str (diretório): sempre str, para comparar
+        self.pushed += 1
+        entry = (-score, str(run_id), self.pushed, grade, total_errors)
+        if len(self.worst) < self.top_k:
+            heapq.heappush(self.worst, entry)
+        elif entry > self.worst[0]:
+            heapq.heapreplace(self.worst, entry)
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.invalid += other.invalid
+        self.passed += other.passed
+        self.overall.merge(other.overall)
+        for section, histogram in other.sections.items():
+            self.sections.setdefault(section, Histogram()).merge(histogram)
+        for section, counts in other.error_types.items():
+            mine = self.error_types.setdefault(section, {})
+            for error_type, n in counts.items():
+                mine[error_type] = mine.get(error_type, 0) + n
+        for section, n in other.runs_with_error.items():
+            self.runs_with_error[section] = self.runs_with_error.get(section, 0) + n
+        for grade, n in other.grades.items():
+            self.grades[grade] = self.grades.get(grade, 0) + n
+        for score, run_id, _, grade, total_errors in other.worst:
+            self.push_worst(-score, run_id, grade, total_errors)
+        return self
+
+    def summary(self):
+        runs = self.runs
+        return {
+            "runs": runs,
+            "invalid": self.invalid,
+            "passed": self.passed,
+            "pass_rate": round(self.passed / runs * 100, 2) if runs else 0.0,
+            "overall": self.overall.stats(),
+            "grades": self.grades,
+            "sections": {
+                section: {
+                    **histogram.stats(),
+                    "runs_with_errors": self.runs_with_error.get(section, 0),
+                    "error_types": dict(sorted(
+                        self.error_types.get(section, {}).items(), key=lambda item: -item[1]
+                    )),
+                }
+                for section, histogram in self.sections.items()
+            },
+            "worst": [
+                {"run": run_id, "overall_score": -score, "grade": grade, "total_errors": total_errors}
+                for score, run_id, _, grade, total_errors in sorted(self.worst, reverse=True)
+            ],
+        }
+
+
+def iter_report_files(paths):
+    """score_report.json de arquivos e diretórios informados, em ordem estável."""
+    for path in paths:
+        if is_archive(path):
+            continue
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                if REPORT_NAME in files:
+                    yield os.path.join(root, REPORT_NAME)
+        elif not path.endswith(".jsonl"):
+            yield path
+
+
+def read_file(path, aggregate):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):  # inclui JSON inválido e UnicodeDecodeError
+        aggregate.invalid += 1
+        return
+    # O diretório identifica a execução (ex.: runs/caso_017/data)
+    aggregate.add(os.path.dirname(path) or path, report)
+
+
+def read_jsonl(path, aggregate, start=0, end=None):
+    """Lê as linhas que começam no intervalo [start, end) de um JSONL."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        # Um intervalo que não começa no início do arquivo pertence à linha seguinte
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while end is None or position < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    aggregate.invalid += 1
+                else:
+                    run_id = report.get("run_id") if isinstance(report, dict) else None
+                    aggregate.add(run_id or f"{path}@{position}", report)
+            position = f.tell()
+
+
+def aggregate_files(paths, top_k=TOP_K):
+    aggregate = Aggregate(top_k)
+    for path in paths:
+        read_file(path, aggregate)
+    return aggregate
+
+
+def aggregate_jsonl_range(path, start, end, top_k=TOP_K):
+    aggregate = Aggregate(top_k)
+    read_jsonl(path, aggregate, start, end)
+    return aggregate
+
+
+def aggregate_archive(path, run_ids=None, top_k=TOP_K):
+    aggregate = Aggregate(top_k)
+    with Archive(path) as archive:
+        for run_id in run_ids if run_ids is not None else archive.iter_runs():
+            try:
+                report = archive.read_json(run_id, REPORT_NAME)
+            except KeyError:
+                continue  # execução arquivada sem relatório
+            except ValueError:
+                aggregate.invalid += 1
+                continue
+            aggregate.add(run_id, report)
+    return aggregate
+
+
+def jsonl_ranges(path, parts):
+    size = os.path.getsize(path)
+    step = max(1, -(-size // parts))
+    return [(start, min(size, start + step)) for start in range(0, size, step)]
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def archive_runs(path):
+    """Ids das execuções de um arquivo, lidos sob demanda (o arquivo fica aberto até o fim)."""
+    with Archive(path) as archive:
+        yield from archive.iter_runs()
+
+
+def peek(iterable, size):
+    """(primeiros `size` itens, iterador com todos os itens)."""
+    iterator = iter(iterable)
+    head = list(islice(iterator, size))
+    return head, chain(head, iterator)
+
+
+def parallel_tasks(paths, workers, top_k):
+    """
+    Tarefas (função, argumentos) para os processos, geradas sob demanda.
+    Entradas pequenas são lidas no próprio processo e devolvidas como Aggregate pronto.
+    """
+    files, all_files = peek(iter_report_files(paths), PARALLEL_MIN_FILES)
+    if workers > 1 and len(files) >= PARALLEL_MIN_FILES:
+        for batch in batches(all_files, FILES_PER_TASK):
+            yield aggregate_files, batch, top_k
+    else:
+        yield aggregate_files(all_files, top_k)
+
+    for path in paths:
+        if path.endswith(".jsonl") and os.path.isfile(path):
+            if workers > 1 and os.path.getsize(path) >= PARALLEL_MIN_BYTES:
+                for start, end in jsonl_ranges(path, workers * 4):
+                    yield aggregate_jsonl_range, path, start, end, top_k
+            else:
+                yield aggregate_jsonl_range(path, 0, None, top_k)
+        elif is_archive(path):
+            runs, all_runs = peek(archive_runs(path), PARALLEL_MIN_FILES)
+            if workers > 1 and len(runs) >= PARALLEL_MIN_FILES:
+                for batch in batches(all_runs, FILES_PER_TASK):
+                    yield aggregate_archive, path, batch, top_k
+            else:
+                yield aggregate_archive(path, all_runs, top_k)
+
+
+def aggregate_reports(paths, top_k=TOP_K, workers=None):
+    """
+    Agrega os relatórios de `paths` (arquivos, diretórios e .jsonl).
+
+    Os caminhos e ids de execução são percorridos sob demanda e no máximo
+    2 x workers tarefas ficam pendentes ao mesmo tempo, então a memória não
+    cresce com o tamanho do corpus.
+
+    Args:
+        workers: número de processos; None escolhe pelo tamanho do corpus, 1 desativa
+    """
+    workers = workers or os.cpu_count() or 1
+    total = Aggregate(top_k)
+    executor = None
+    pending = set()
+    try:
+        for task in parallel_tasks(paths, workers, top_k):
+            if isinstance(task, Aggregate):
+                total.merge(task)
+                continue
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            pending.add(executor.submit(*task))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    total.merge(future.result())
+        for future in as_completed(pending):
+            total.merge(future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return total
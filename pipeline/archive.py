@@ -0,0 +1,422 @@
+"""
+Arquivo compactado de execuções concluídas, com acesso aleatório por artefato.
+
+Formato (um diretório, ex.: runs.archive/):
+  segment-00000.seg ...  artefatos compactados, um após o outro (somente acréscimo)
+  dictionary.bin         dicionário compartilhado, montado a partir das primeiras execuções
+  index.sqlite           (execução, artefato) -> segmento, offset, tamanho e codec
+
+Cada artefato é compactado isoladamente com o dicionário compartilhado, o que
+permite ler qualquer artefato de qualquer execução com um seek e uma
+descompressão, sem abrir o segmento inteiro. O JSON e o PlantUML das execuções
+repetem muito texto (chaves, @startuml, setas...), que o dicionário absorve.
+Usa zstd quando o pacote zstandard está instalado; senão, zlib com dicionário
+(zdict). PNGs já são compactados e são guardados sem recompressão.
+
+Uso:
+  python3 pipeline/archive.py pack runs.archive jobs/* [--remove]
+  python3 pipeline/archive.py list runs.archive
+  python3 pipeline/archive.py cat runs.archive <execução> score_report.json
+  python3 pipeline/archive.py rescore runs.archive [<execução> ...]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstandard é opcional
+    zstandard = None
+
+
+INDEX_FILE = "index.sqlite"
+DICTIONARY_FILE = "dictionary.bin"
+SEGMENT_BYTES = 64 * 1024 * 1024
+# zlib só aproveita os últimos 32 KB do dicionário
+DICTIONARY_BYTES = 32 * 1024
+DICTIONARY_SAMPLE_RUNS = 50
+
+# Artefatos de uma execução: nome -> subdiretório (em execuções no formato jobs/<id>)
+ARTIFACTS = {
+    "study_case.txt": "data",
+    "root.json": "data",
+    "usecase.puml": "data",
+    "classes.puml": "data",
+    "sequence.puml": "data",
+    "report.json": "data",
+    "score_report.json": "data",
+    "score_report.txt": "data",
+    "usecase.png": "diagrams",
+    "classes.png": "diagrams",
+    "sequence.png": "diagrams",
+}
+BINARY_SUFFIXES = (".png",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY, added REAL, overall_score REAL, grade TEXT
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run TEXT, name TEXT, segment INTEGER, offset INTEGER, length INTEGER,
+    size INTEGER, codec TEXT, PRIMARY KEY (run, name)
+);
+"""
+
+
+def is_archive(path):
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+def run_files(run_dir):
+    """Artefatos existentes de uma execução (jobs/<id> ou diretório data)."""
+    files = {}
+    for name, sub in ARTIFACTS.items():
+        for candidate in (os.path.join(run_dir, sub, name), os.path.join(run_dir, name)):
+            if os.path.isfile(candidate):
+                files[name] = candidate
+                break
+    return files
+
+
+def build_dictionary(samples, size=DICTIONARY_BYTES):
+    """
+    Dicionário de conteúdo bruto com as linhas que se repetem entre as amostras.
+    As mais frequentes ficam no fim, onde o zlib as alcança com distâncias menores.
+    """
+    counts = {}
+    for sample in samples:
+        for line in set(sample.splitlines(keepends=True)):
+            if len(line.strip()) > 2:
+                counts[line] = counts.get(line, 0) + 1
+
+    shared = [line for line, n in counts.items() if n > 1]
+    shared.sort(key=lambda line: (counts[line], len(line)))
+    chosen = []
+    total = 0
+    for line in reversed(shared):
+        if total + len(line) > size:
+            break
+        chosen.append(line)
+        total += len(line)
+    return "".join(reversed(chosen)).encode("utf-8")
+
+
+class Archive:
+    def __init__(self, path, create=False):
+        if not create and not is_archive(path):
+            raise FileNotFoundError(f"'{path}' is not a run archive")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(os.path.join(path, INDEX_FILE))
+        self.db.executescript(SCHEMA)
+        self.codec = self.meta("codec")
+        if self.codec is None:
+            self.codec = "zstd" if zstandard else "zlib"
+            self.set_meta("codec", self.codec)
+            self.db.commit()
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError(f"'{path}' was written with zstd; install the zstandard package to read it")
+
+        self.dictionary = None
+        dictionary_path = os.path.join(path, DICTIONARY_FILE)
+        if os.path.exists(dictionary_path):
+            with open(dictionary_path, "rb") as f:
+                self.dictionary = f.read()
+        self._zstd_dictionary = None
+        self.segments = {}
+
+    def close(self):
+        for handle in self.segments.values():
+            handle.close()
+        self.segments = {}
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    # -- compressão ----------------------------------------------------------
+
+    def compress(self, data, binary):
+        if binary:
+            return data, "raw"
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=19, dict_data=self.zstd_dictionary()).compress(data), "zstd"
+        compressor = zlib.compressobj(9, zdict=self.dictionary) if self.dictionary else zlib.compressobj(9)
+        return compressor.compress(data) + compressor.flush(), "zlib"
+
+    def decompress(self, data, codec):
+        if codec == "raw":
+            return data
+        if codec == "zstd":
+            return zstandard.ZstdDecompressor(dict_data=self.zstd_dictionary()).decompress(data)
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def zstd_dictionary(self):
+        if not self.dictionary:
+            return None
+        if self._zstd_dictionary is None:
+            self._zstd_dictionary = zstandard.ZstdCompressionDict(
+                self.dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+            )
+        return self._zstd_dictionary
+
+    def ensure_dictionary(self, run_dirs):
+        """Monta o dicionário compartilhado na primeira escrita; depois ele é fixo."""
+        if self.dictionary is not None:
+            return
+        samples = []
+        for run_dir in run_dirs[:DICTIONARY_SAMPLE_RUNS]:
+            for name, path in run_files(run_dir).items():
+                if not name.endswith(BINARY_SUFFIXES):
+                    with open(path, "r", encoding="utf-8", errors="replace") as f:
+                        samples.append(f.read())
+        self.dictionary = build_dictionary(samples)
+        with open(os.path.join(self.path, DICTIONARY_FILE), "wb") as f:
+            f.write(self.dictionary)
+
+    # -- escrita -------------------------------------------------------------
+
+    def current_segment(self):
+        segment = int(self.meta("segment") or 0)
+        path = self.segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) >= SEGMENT_BYTES:
+            segment += 1
+            self.set_meta("segment", segment)
+        return segment
+
+    def segment_path(self, segment):
+        return os.path.join(self.path, f"segment-{segment:05d}.seg")
+
+    def add_run(self, run_id, files):
+        """
+        Acrescenta os artefatos de uma execução ao segmento corrente.
+        O índice só é gravado depois dos dados, então nunca aponta para bytes ausentes.
+        """
+        segment = self.current_segment()
+        rows = []
+        with open(self.segment_path(segment), "ab") as out:
+            for name, path in files.items():
+                with open(path, "rb") as f:
+                    data = f.read()
+                packed, codec = self.compress(data, name.endswith(BINARY_SUFFIXES))
+                rows.append((run_id, name, segment, out.tell(), len(packed), len(data), codec))
+                out.write(packed)
+            out.flush()
+            os.fsync(out.fileno())
+
+        scoring = {}
+        if "score_report.json" in files:
+            with open(files["score_report.json"], "r", encoding="utf-8") as f:
+                scoring = json.load(f).get("scoring", {})
+
+        self.db.execute("DELETE FROM artifacts WHERE run = ?", (run_id,))
+        self.db.executemany("INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.db.execute("INSERT OR REPLACE INTO runs (run, added) VALUES (?, ?)", (run_id, time.time()))
+        self.set_score(run_id, scoring)
+
+    def set_score(self, run_id, scoring):
+        """Atualiza o score resumido da execução no índice (usado por `list`)."""
+        self.db.execute(
+            "UPDATE runs SET overall_score = ?, grade = ? WHERE run = ?",
+            (scoring.get("overall_score"), scoring.get("grade"), run_id),
+        )
+        self.db.commit()
+
+    def replace(self, run_id, name, data):
+        """Grava uma nova versão de um artefato (a anterior fica no segmento, sem referência)."""
+        segment = self.current_segment()
+        packed, codec = self.compress(data, name.endswith(BINARY_SUFFIXES))
+        with open(self.segment_path(segment), "ab") as out:
+            offset = out.tell()
+            out.write(packed)
+            out.flush()
+            os.fsync(out.fileno())
+        self.db.execute(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, name, segment, offset, len(packed), len(data), codec),
+        )
+        self.db.commit()
+
+    # -- leitura -------------------------------------------------------------
+
+    def runs(self):
+        return list(self.iter_runs())
+
+    def iter_runs(self):
+        """Ids das execuções em ordem, lidos do índice sob demanda."""
+        for row in self.db.execute("SELECT run FROM runs ORDER BY run"):
+            yield row[0]
+
+    def names(self, run_id):
+        return [row[0] for row in self.db.execute("SELECT name FROM artifacts WHERE run = ? ORDER BY name", (run_id,))]
+
+    def read(self, run_id, name):
+        row = self.db.execute(
+            "SELECT segment, offset, length, codec FROM artifacts WHERE run = ? AND name = ?",
+            (run_id, name),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"{run_id}/{name}")
+        segment, offset, length, codec = row
+        handle = self.segments.get(segment)
+        if handle is None:
+            handle = self.segments[segment] = open(self.segment_path(segment), "rb")
+        handle.seek(offset)
+        return self.decompress(handle.read(length), codec)
+
+    def read_text(self, run_id, name):
+        return self.read(run_id, name).decode("utf-8")
+
+    def read_json(self, run_id, name):
+        return json.loads(self.read(run_id, name))
+
+    def iter_reports(self, run_ids=None):
+        """(execução, score_report) de cada execução arquivada."""
+        for run_id in run_ids if run_ids is not None else self.iter_runs():
+            try:
+                yield run_id, self.read_json(run_id, "score_report.json")
+            except KeyError:
+                continue
+
+    def stats(self):
+        count, stored, size = self.db.execute(
+            "SELECT COUNT(DISTINCT run), COALESCE(SUM(length), 0), COALESCE(SUM(size), 0) FROM artifacts"
+        ).fetchone()
+        return {"runs": count, "stored_bytes": stored, "original_bytes": size, "codec": self.codec}
+
+
+def run_ids(run_dirs):
+    """
+    Id de cada execução: o caminho relativo à raiz comum, sem o "data" final
+    (runs/caso_017/data -> caso_017; jobs/<id> -> <id>).
+    """
+    bases = []
+    for run_dir in run_dirs:
+        base = os.path.abspath(run_dir)
+        if os.path.basename(base) == "data":
+            base = os.path.dirname(base)
+        bases.append(base)
+    root = os.path.commonpath(bases) if len(set(bases)) > 1 else os.path.dirname(bases[0])
+    return [os.path.relpath(base, root).replace(os.sep, "/") for base in bases]
+
+
+def unique_id(run_id, taken):
+    """run_id, ou run_id-2, run_id-3... se já estiver em uso."""
+    candidate, n = run_id, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{run_id}-{n}"
+    return candidate
+
+
+def verify_run(archive, run_id, files):
+    """True se cada artefato lido de volta do arquivo é idêntico à origem."""
+    for name, path in files.items():
+        with open(path, "rb") as f:
+            original = f.read()
+        try:
+            if archive.read(run_id, name) != original:
+                return False
+        except (KeyError, OSError, ValueError):
+            return False
+    return True
+
+
+def pack(archive_path, run_dirs, remove=False):
+    """Arquiva execuções concluídas (com score_report.json). Retorna quantas foram arquivadas."""
+    completed = [d for d in run_dirs if "score_report.json" in run_files(d)]
+    skipped = len(run_dirs) - len(completed)
+    removed = 0
+
+    with Archive(archive_path, create=True) as archive:
+        archive.ensure_dictionary(completed)
+        # Ids já usados no arquivo ou neste lote nunca são sobrescritos
+        taken = set(archive.iter_runs())
+        for run_dir, run_id in zip(completed, run_ids(completed) if completed else []):
+            if run_id in taken:
+                new_id = unique_id(run_id, taken)
+                print(f"[WARN] run id '{run_id}' is already in use; {run_dir} archived as '{new_id}'")
+                run_id = new_id
+            taken.add(run_id)
+
+            files = run_files(run_dir)
+            archive.add_run(run_id, files)
+            if remove:
+                # Só remove a origem se tudo foi gravado e relido sob o próprio id
+                if verify_run(archive, run_id, files):
+                    shutil.rmtree(run_dir)
+                    removed += 1
+                else:
+                    print(f"[ERROR] {run_dir} could not be verified in the archive as '{run_id}'; not removed")
+        stats = archive.stats()
+
+    ratio = stats["original_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+    print(f"[OK] {len(completed)} runs packed into {archive_path} ({skipped} incomplete skipped)")
+    if remove:
+        print(f"     {removed} source directories removed")
+    print(f"     {stats['runs']} runs, {stats['original_bytes']} -> {stats['stored_bytes']} bytes "
+          f"({ratio:.1f}x, {stats['codec']})")
+    return len(completed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack pipeline runs into a compressed archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = commands.add_parser("pack", help="archive completed run directories")
+    pack_parser.add_argument("archive")
+    pack_parser.add_argument("runs", nargs="+", help="run directories (jobs/<id> or a data directory)")
+    pack_parser.add_argument("--remove", action="store_true", help="delete each run directory once archived")
+
+    list_parser = commands.add_parser("list", help="list archived runs")
+    list_parser.add_argument("archive")
+
+    cat_parser = commands.add_parser("cat", help="print one artifact of one run")
+    cat_parser.add_argument("archive")
+    cat_parser.add_argument("run")
+    cat_parser.add_argument("name")
+
+    rescore_parser = commands.add_parser("rescore", help="re-score archived runs without LLM calls")
+    rescore_parser.add_argument("archive")
+    rescore_parser.add_argument("runs", nargs="*")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "pack":
+            pack(args.archive, [d for d in args.runs if os.path.isdir(d)], args.remove)
+        elif args.command == "list":
+            with Archive(args.archive) as archive:
+                for run_id, score, grade in archive.db.execute(
+                        "SELECT run, overall_score, grade FROM runs ORDER BY run"):
+                    print(f"{run_id}\t{score}\t{grade}\t{' '.join(archive.names(run_id))}")
+        elif args.command == "cat":
+            with Archive(args.archive) as archive:
+                sys.stdout.buffer.write(archive.read(args.run, args.name))
+        elif args.command == "rescore":
+            from rescore import run_archived
+            run_archived(args.archive, args.runs)
+    except (FileNotFoundError, KeyError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
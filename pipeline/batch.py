@@ -0,0 +1,277 @@
+"""
+Execução do pipeline sobre um corpus inteiro usando a Batch API.
+
+Cada etapa é executada para todos os casos antes da próxima: as chamadas à
+LLM de todos os casos são reunidas em um único arquivo de entrada, enviado
+como batch; quando o batch termina, as respostas são devolvidas a cada caso
+e a etapa roda de novo, agora sem nenhuma chamada interativa (ver
+utils.batch_session). Respostas cortadas por limite de tokens geram uma nova
+rodada só com as continuações.
+
+As respostas já recebidas ficam em <corpus>/.batch/results.jsonl e o batch em
+andamento em <corpus>/.batch/pending.json, então uma execução interrompida
+retoma do ponto em que parou sem reenviar nada. Requisições que falharam não
+são gravadas: fazem o caso falhar nesta execução e são reenviadas na próxima.
+
+Para testes locais, aponte UML_BATCH_BASE_URL para o batch_server.py
+(ex.: http://127.0.0.1:8100/v1).
+
+Uso: python3 pipeline/batch.py corpus/ [--poll 60] [--max-rounds 4]
+     (cada subdiretório de corpus/ com um study_case.txt é um caso)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from model import PipelineModel
+from routing import call_cost
+from runner import STAGES
+from utils import BatchPending, batch_session, llm_session
+
+
+load_dotenv()
+
+BATCH_BASE_URL = os.getenv("UML_BATCH_BASE_URL")
+batch_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=BATCH_BASE_URL or None)
+
+STATE_DIR = ".batch"
+RESULTS_FILE = "results.jsonl"
+PENDING_FILE = "pending.json"
+REPORT_FILE = "batch_report.json"
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Limite de requisições por arquivo de entrada da Batch API
+MAX_BATCH_REQUESTS = 50000
+# Desconto da Batch API sobre o preço interativo
+BATCH_DISCOUNT = 0.5
+MAX_ROUNDS = 4
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def find_cases(corpus):
+    return [
+        os.path.join(corpus, name) for name in sorted(os.listdir(corpus))
+        if os.path.isfile(os.path.join(corpus, name, "study_case.txt"))
+    ]
+
+
+def load_results(state_dir):
+    results = {}
+    path = os.path.join(state_dir, RESULTS_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if "error" not in entry["body"]:
+                        results[entry["key"]] = entry["body"]
+    return results
+
+
+def save_results(state_dir, results):
+    """Acrescenta as respostas recebidas ao arquivo de resultados, exceto os erros."""
+    with open(os.path.join(state_dir, RESULTS_FILE), "a", encoding="utf-8") as f:
+        for key, body in results.items():
+            if "error" in body:
+                continue
+            f.write(json.dumps({"key": key, "body": body}, ensure_ascii=False) + "\n")
+
+
+def save_pending(state_dir, batch_ids):
+    path = os.path.join(state_dir, PENDING_FILE)
+    if batch_ids:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"batch_ids": batch_ids}, f)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def submit(requests, label, state_dir):
+    """Grava as requisições em arquivos JSONL e envia cada um como um batch. Retorna os ids."""
+    items = list(requests.items())
+    batch_ids = []
+    for part, start in enumerate(range(0, len(items), MAX_BATCH_REQUESTS)):
+        path = os.path.join(state_dir, f"{label}-{part}.input.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for key, body in items[start:start + MAX_BATCH_REQUESTS]:
+                f.write(json.dumps({"custom_id": key, "method": "POST", "url": ENDPOINT, "body": body},
+                                   ensure_ascii=False) + "\n")
+
+        with open(path, "rb") as f:
+            input_file = batch_client.files.create(file=f, purpose="batch")
+        batch = batch_client.batches.create(
+            input_file_id=input_file.id, endpoint=ENDPOINT,
+            completion_window=COMPLETION_WINDOW, metadata={"label": label},
+        )
+        print(f"[BATCH] submitted {batch.id} ({len(items[start:start + MAX_BATCH_REQUESTS])} requests)")
+        batch_ids.append(batch.id)
+
+    save_pending(state_dir, batch_ids)
+    return batch_ids
+
+
+def wait(batch_id, poll):
+    """Consulta o batch até um estado final, com intervalo crescente até `poll` segundos."""
+    delay = 1.0
+    last = None
+    while True:
+        batch = batch_client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        progress = f"{counts.completed + counts.failed}/{counts.total}" if counts else "?"
+        if (batch.status, progress) != last:
+            print(f"[BATCH] {batch_id}: {batch.status} ({progress})")
+            last = (batch.status, progress)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(delay)
+        delay = min(poll, delay * 2)
+
+
+def download(file_id):
+    """Linhas de um arquivo de saída/erro: custom_id -> corpo da resposta ou {"error": ...}."""
+    results = {}
+    if not file_id:
+        return results
+    for line in batch_client.files.content(file_id).text.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        response = entry.get("response") or {}
+        if response.get("status_code") == 200 and not entry.get("error"):
+            results[entry["custom_id"]] = response["body"]
+        else:
+            error = entry.get("error") or response.get("body", {}).get("error") or response
+            results[entry["custom_id"]] = {"error": error}
+    return results
+
+
+def collect(batch_ids, poll, state_dir):
+    results = {}
+    for batch_id in batch_ids:
+        batch = wait(batch_id, poll)
+        if batch.status != "completed":
+            print(f"[WARN] batch {batch_id} ended as {batch.status}; missing requests go to the next round")
+        results.update(download(batch.output_file_id))
+        results.update(download(getattr(batch, "error_file_id", None)))
+    errors = sum(1 for body in results.values() if "error" in body)
+    if errors:
+        print(f"[WARN] {errors} request(s) failed; they will be sent again on the next run")
+    save_results(state_dir, results)
+    save_pending(state_dir, [])
+    return results
+
+
+def run_stage(name, stage, cases, models, results, state_dir, poll, max_rounds, usage):
+    """
+    Executa uma etapa para todos os casos, enviando batches até todos terminarem.
+    Retorna {caso: erro} dos casos que falharam.
+    """
+    failed = {}
+    pending = list(cases)
+    for round_number in range(1, max_rounds + 1):
+        requests = {}
+        waiting = []
+        for case in pending:
+            try:
+                with llm_session() as calls, batch_session(results, requests):
+                    stage(case, models[case])
+                usage.setdefault(name, []).extend(calls)
+            except BatchPending:
+                waiting.append(case)
+            except Exception as e:
+                print(f"[ERROR] {case}: {name} failed: {e}")
+                failed[case] = f"{name}: {e}"
+
+        if not waiting:
+            print(f"[OK] {name} completed for {len(pending) - len(failed)} case(s)")
+            return failed
+        if round_number == max_rounds:
+            break
+
+        print(f"\n[BATCH] {name} round {round_number}: {len(requests)} request(s) from {len(waiting)} case(s)")
+        batch_ids = submit(requests, f"{name}-{round_number}", state_dir)
+        results.update(collect(batch_ids, poll, state_dir))
+        pending = waiting
+
+    for case in waiting:
+        failed[case] = f"{name}: no response after {max_rounds} rounds"
+        print(f"[ERROR] {case}: {failed[case]}")
+    return failed
+
+
+def run(corpus, poll=60, max_rounds=MAX_ROUNDS):
+    state_dir = os.path.join(corpus, STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    cases = find_cases(corpus)
+    print(f"=== BATCH PIPELINE: {len(cases)} case(s) in {corpus} ===")
+
+    results = load_results(state_dir)
+    # Execução anterior interrompida com um batch ainda em andamento
+    pending_path = os.path.join(state_dir, PENDING_FILE)
+    if os.path.exists(pending_path):
+        with open(pending_path, "r", encoding="utf-8") as f:
+            batch_ids = json.load(f)["batch_ids"]
+        print(f"[BATCH] resuming {len(batch_ids)} pending batch(es)")
+        results.update(collect(batch_ids, poll, state_dir))
+
+    models = {case: PipelineModel() for case in cases}
+    usage = {}
+    failed = {}
+    started = time.time()
+
+    for name, stage in STAGES:
+        active = [case for case in cases if case not in failed]
+        if not active:
+            break
+        print(f"\n[RUNNING] {name} ({len(active)} case(s)) ...")
+        failed.update(run_stage(name, stage, active, models, results, state_dir, poll, max_rounds, usage))
+
+    # Casos idênticos compartilham a mesma requisição: cada uma é paga uma única vez
+    unique = {
+        name: list({call.get("request") or id(call): call for call in calls}.values())
+        for name, calls in usage.items()
+    }
+    interactive_cost = sum(call_cost(call) for calls in unique.values() for call in calls)
+    report = {
+        "cases": len(cases),
+        "completed": len(cases) - len(failed),
+        "failed": failed,
+        "requests": {name: len(calls) for name, calls in unique.items()},
+        "interactive_cost_usd": round(interactive_cost, 6),
+        "batch_cost_usd": round(interactive_cost * BATCH_DISCOUNT, 6),
+        "wall_seconds": round(time.time() - started, 3),
+    }
+    with open(os.path.join(corpus, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n=== BATCH PIPELINE FINISHED: {report['completed']}/{len(cases)} case(s) completed ===")
+    print(f"Estimated cost: ${report['batch_cost_usd']:.4f} "
+          f"(${report['interactive_cost_usd']:.4f} with interactive calls)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline over a corpus through the Batch API")
+    parser.add_argument("corpus", help="directory with one subdirectory (containing study_case.txt) per case")
+    parser.add_argument("--poll", type=float, default=60, help="maximum seconds between status checks")
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS,
+                        help="batches per stage (extra rounds continue truncated responses)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.corpus):
+        print(f"[ERROR] corpus directory '{args.corpus}' not found")
+        sys.exit(1)
+    report = run(args.corpus, args.poll, args.max_rounds)
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Orçamento de tokens por chamada à LLM.
+
+Antes de cada chamada o prompt é medido localmente (tiktoken, se disponível;
+senão ~4 caracteres por token) e o max_tokens é dimensionado a partir do
+tamanho da entrada e da razão saída/entrada observada nas últimas chamadas
+da mesma etapa com o mesmo modelo (percentil alto). O histórico só aumenta o
+orçamento: nunca fica abaixo do limite original, salvo se o chamador pedir.
+
+O histórico fica em um local compartilhado, fora dos artefatos de cada
+execução (~/.cache/uml-pipeline/token_history.json ou UML_TOKEN_HISTORY), para
+que jobs do serve.py, casos do batch.py e execuções A/B, cada um em um
+diretório novo, aproveitem o que já foi observado.
+
+Respostas cortadas por limite (finish_reason == "length") são continuadas a
+partir do ponto em que pararam; ver utils.call_llm. Cada continuação reenvia
+o prompt e a parte já gerada, então o número de continuações e os tokens de
+entrada reenviados são limitados e registrados no histórico; passado o
+limite, a pergunta é refeita uma vez com um orçamento maior.
+"""
+
+import json
+import math
+import os
+import threading
+
+from context import count_tokens
+
+
+HISTORY_FILE = "token_history.json"
+HISTORY_PATH = os.getenv("UML_TOKEN_HISTORY") or os.path.join(
+    os.path.expanduser("~"), ".cache", "uml-pipeline", HISTORY_FILE
+)
+HISTORY_SIZE = 20
+# O orçamento usa um percentil alto das razões recentes, e só com amostras suficientes
+PERCENTILE = 0.9
+MIN_SAMPLES = 5
+
+# Orçamento usado enquanto a etapa não tem histórico (comportamento original)
+DEFAULT_MAX_TOKENS = 2000
+MIN_MAX_TOKENS = 256
+# Margem sobre o percentil da razão saída/entrada
+SAFETY_MARGIN = 1.25
+MAX_CONTINUATIONS = 3
+# Tokens de entrada reenviados nas continuações: no máximo este múltiplo do prompt
+MAX_CONTINUATION_INPUT = 3.0
+
+# Limites por modelo: (janela de contexto, máximo de tokens de saída)
+MODEL_LIMITS = {
+    "gpt-4o-mini": (128000, 16384),
+    "gpt-4o": (128000, 16384),
+}
+DEFAULT_LIMITS = (128000, 4096)
+
+_lock = threading.Lock()
+
+
+def load_history(path=None):
+    path = path or HISTORY_PATH
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def plan(prompt, stage, model):
+    """
+    Mede o prompt e escolhe o max_tokens da chamada.
+
+    Returns:
+        (tokens do prompt, max_tokens)
+
+    Raises:
+        ValueError: se o prompt sozinho não cabe na janela de contexto do modelo
+    """
+    context_window, output_limit = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+    input_tokens = count_tokens(prompt)
+    available = context_window - input_tokens
+    if available < MIN_MAX_TOKENS:
+        raise ValueError(
+            f"{stage}: prompt has {input_tokens} tokens, too large for {model} "
+            f"({context_window}-token context window)"
+        )
+
+    ratios = load_history().get(stage, {}).get(model, {}).get("ratios", [])
+    budget = DEFAULT_MAX_TOKENS
+    if len(ratios) >= MIN_SAMPLES:
+        # As razões incluem a saída das continuações: uma etapa que já foi cortada
+        # recebe orçamento para a resposta inteira e não paga as continuações de novo.
+        # O histórico só aumenta o orçamento; nunca fica abaixo do limite original.
+        budget = max(budget, math.ceil(input_tokens * percentile(ratios, PERCENTILE) * SAFETY_MARGIN))
+    return input_tokens, max(MIN_MAX_TOKENS, min(budget, output_limit, available))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def retry_budget(model, input_tokens, observed):
+    """max_tokens para refazer uma resposta que esgotou as continuações: o dobro do já gerado."""
+    context_window, output_limit = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+    budget = max(DEFAULT_MAX_TOKENS, math.ceil(observed * 2 * SAFETY_MARGIN))
+    return min(budget, output_limit, context_window - input_tokens)
+
+
+def continuation_cost(input_tokens, spent, partial, attempt):
+    """
+    Tokens de entrada de mais uma continuação (o prompt original mais a parte já
+    gerada), ou None se ela passar dos limites: MAX_CONTINUATIONS ou
+    MAX_CONTINUATION_INPUT x o prompt em tokens reenviados.
+    """
+    cost = input_tokens + count_tokens(partial)
+    if attempt > MAX_CONTINUATIONS or spent + cost > MAX_CONTINUATION_INPUT * max(input_tokens, 1):
+        return None
+    return cost
+
+
+def record(stage, model, input_tokens, output_tokens, max_tokens, continuations=0, continuation_tokens=0):
+    """Acrescenta a razão saída/entrada da chamada ao histórico da etapa e do modelo."""
+    if not input_tokens:
+        return
+    with _lock:
+        history = load_history()
+        entry = history.setdefault(stage, {}).setdefault(
+            model, {"ratios": [], "calls": 0, "truncated": 0, "continuation_input_tokens": 0}
+        )
+        entry["ratios"] = (entry["ratios"] + [round(output_tokens / input_tokens, 4)])[-HISTORY_SIZE:]
+        entry["calls"] += 1
+        entry["truncated"] += 1 if continuations else 0
+        entry["continuation_input_tokens"] = entry.get("continuation_input_tokens", 0) + continuation_tokens
+        entry["last"] = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "max_tokens": max_tokens,
+            "continuations": continuations,
+            "continuation_input_tokens": continuation_tokens,
+        }
+        try:
+            os.makedirs(os.path.dirname(HISTORY_PATH) or ".", exist_ok=True)
+            # Nome temporário por processo: várias execuções podem gravar ao mesmo tempo
+            tmp_path = f"{HISTORY_PATH}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(history, f, indent=2)
+            os.replace(tmp_path, HISTORY_PATH)
+        except OSError as e:
+            print(f"[WARN] could not save token history: {e}")
+
+
+def continuation_messages(prompt, partial):
+    """Mensagens que pedem apenas o restante de uma resposta cortada."""
+    return [
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": (
+            "Your previous answer was cut off by the length limit. Continue exactly where it "
+            "stopped, starting with the next character. Do not repeat anything already written "
+            "and do not add explanations or code fences."
+        )},
+    ]
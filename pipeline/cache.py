@@ -0,0 +1,53 @@
+"""
+Cache de resultados de verificação por seção.
+Cada seção é indexada pelos hashes de conteúdo dos artefatos dos quais depende.
+"""
+
+import hashlib
+import json
+import os
+
+
+def content_hash(text):
+    """Retorna o SHA-256 (hex) de um texto."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    """Retorna o SHA-256 (hex) do conteúdo de um arquivo."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def section_key(artifact_hashes, instructions="", settings=None):
+    """
+    Gera a chave de cache de uma seção.
+
+    Args:
+        artifact_hashes: dict {nome_do_artefato: hash}
+        instructions: texto fixo do prompt da seção (mudanças no prompt invalidam o cache)
+        settings: dict opcional com o que mais muda a resposta (ex.: modelo, modo de contexto)
+    """
+    parts = [f"{name}={artifact_hashes[name]}" for name in sorted(artifact_hashes)]
+    parts.append(content_hash(instructions))
+    parts.extend(f"{name}={value}" for name, value in sorted((settings or {}).items()))
+    return content_hash("\n".join(parts))
+
+
+def load_cache(path):
+    """Carrega o cache do disco. Retorna dict vazio se não existir ou estiver corrompido."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def save_cache(cache, path):
+    """Salva o cache no disco de forma atômica."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -1,13 +1,13 @@
-from utils import call_llm
-import json
+from utils import call_llm_to_file, validate_puml
+from context import build_context
+from model import PipelineModel
+from delta import regenerate
+from collections import defaultdict
+import os
 
 
-with open("data/root.json") as f:
-    root = json.load(f)
-
-usecase = open("data/usecase.puml").read()
-
-prompt = f"""
+def build_prompt(context):
+    return f"""
 Generate a CLASS diagram in PlantUML based EXCLUSIVELY on the input, which consists of:
 1) A JSON containing the conceptual elements extracted directly from the case study text.
 2) A USE CASE diagram derived from this JSON.
@@ -37,10 +37,10 @@ Use simple names textually based on the JSON.
 Avoid relationships not mentioned.
 
 JSON:
-{json.dumps(root, indent=2)}
+{context['root']}
 
 Use case diagram:
-{usecase}
+{context['usecase']}
 
 The final result must be a valid UML diagram in PlantUML, with no additional explanations or comments.
 
@@ -49,7 +49,24 @@ DO NOT use ``` or any code block delimiters.
 Return ONLY a valid PlantUML code.
 """
 
-puml = call_llm(prompt)
 
-with open("data/classes.puml", "w") as f:
-    f.write(puml)
+def run(data_dir="data", model=None):
+    model = (model or PipelineModel()).ensure(data_dir, "root", "usecase")
+    context = build_context(
+        "classes", model.root.to_dict(), {"usecase": model.sources["usecase"]}, data_dir=data_dir,
+    )
+
+    puml = regenerate(
+        "classes", model, data_dir, build_prompt(defaultdict(str)),
+        lambda: call_llm_to_file(
+            build_prompt(context), os.path.join(data_dir, "classes.puml"),
+            stage="classes", validate=validate_puml, metrics_dir=data_dir,
+        ),
+    )
+    model.set("classes", puml)
+
+    return model
+
+
+if __name__ == "__main__":
+    run()
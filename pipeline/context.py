@@ -0,0 +1,238 @@
+"""
+Construção de contexto enxuto para os prompts das etapas do pipeline.
+Serializa o root.json de forma compacta e envia a cada etapa apenas a fatia
+do modelo (e dos diagramas anteriores) de que ela realmente precisa.
+
+Defina UML_FULL_CONTEXT=1 para enviar o contexto completo (comportamento original).
+"""
+
+import json
+import os
+
+from model import CLASS_DECL, RELATION, element_name, name_key
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken é opcional
+    _ENCODING = None
+
+
+FULL_CONTEXT = os.getenv("UML_FULL_CONTEXT") == "1"
+STATS_FILE = "context_stats.json"
+# Abaixo disto, a poda pelo cenário não é confiável (nomes em outro idioma,
+# sinônimos) e a etapa recebe a fatia inteira
+MIN_REACHED = 2
+
+# Chaves do root.json usadas por cada etapa/seção
+STAGE_KEYS = {
+    "usecase": ["actors", "events", "textual_relations"],
+    "classes": ["actors", "entities", "events", "textual_relations"],
+    "sequence": ["actors", "entities", "events", "textual_relations"],
+    "json_vs_usecase": ["actors", "events"],
+    "json_vs_classes": ["actors", "entities", "events", "textual_relations"],
+    "json_vs_sequence": ["actors", "entities", "events", "textual_relations"],
+}
+
+
+def count_tokens(text):
+    """Conta tokens com tiktoken, se disponível; senão estima ~4 caracteres por token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def compact_json(data):
+    """Serializa JSON sem espaços nem indentação."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def full_json(data):
+    """Serialização original usada nos prompts (indent=2)."""
+    return json.dumps(data, indent=2)
+
+
+def slice_root(root, keys):
+    """Mantém apenas as chaves informadas do root.json."""
+    return {key: root[key] for key in keys if key in root}
+
+
+def reachable_root(root, text, keys, depth=1):
+    """
+    Fatia do root.json alcançável a partir de um texto (ex.: um cenário).
+
+    Atores e entidades citados no texto são as sementes; relações textuais
+    que tocam as sementes trazem a outra ponta, até `depth` saltos.
+    Eventos são mantidos se mencionarem algum elemento alcançado.
+    """
+    text_key = name_key(text)
+    elements = [element_name(e) for e in root.get("actors", []) + root.get("entities", [])]
+    reached = {name_key(e) for e in elements if name_key(e) and name_key(e) in text_key}
+
+    relations = [r for r in root.get("textual_relations", []) if isinstance(r, dict)]
+    for _ in range(depth):
+        frontier = set()
+        for relation in relations:
+            ends = {name_key(relation.get("from", "")), name_key(relation.get("to", ""))}
+            if ends & reached:
+                frontier |= ends
+        if frontier <= reached:
+            break
+        reached |= frontier
+
+    def keep(element):
+        return name_key(element_name(element)) in reached
+
+    def mentions(element):
+        return any(name in name_key(element_name(element)) for name in reached)
+
+    pruned = {}
+    for key in keys:
+        values = root.get(key, [])
+        if key in ("actors", "entities"):
+            pruned[key] = [e for e in values if keep(e)]
+        elif key == "textual_relations":
+            pruned[key] = [
+                r for r in values
+                if isinstance(r, dict)
+                and name_key(r.get("from", "")) in reached
+                and name_key(r.get("to", "")) in reached
+            ]
+        elif key == "events":
+            pruned[key] = [e for e in values if mentions(e)]
+        else:
+            pruned[key] = values
+    return pruned, reached
+
+
+def compact_puml(puml):
+    """Remove linhas vazias, comentários e indentação de um diagrama PlantUML."""
+    lines = []
+    for line in puml.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("'"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines)
+
+
+def class_fragments(puml, names):
+    """
+    Mantém do diagrama de classes apenas as classes cujos nomes estão em `names`
+    (chaves de name_key) e as relações entre elas.
+    Se nenhuma classe for reconhecida, devolve o diagrama compactado inteiro.
+    """
+    lines = compact_puml(puml).splitlines()
+    kept = []
+    found_class = False
+    keep_block = True
+    depth = 0
+
+    for line in lines:
+        if depth > 0:
+            depth += line.count("{") - line.count("}")
+            if keep_block:
+                kept.append(line)
+            continue
+
+        declaration = CLASS_DECL.match(line)
+        if declaration:
+            found_class = True
+            label, alias, plain = declaration.groups()
+            keep_block = any(name_key(n) in names for n in (label, alias, plain) if n)
+            depth = max(0, line.count("{") - line.count("}"))
+            if keep_block:
+                kept.append(line)
+            continue
+
+        relation = RELATION.match(line)
+        if relation and not line.startswith("@"):
+            left, right = (name_key(g.strip('"')) for g in relation.groups())
+            if left in names and right in names:
+                kept.append(line)
+            continue
+
+        # Cabeçalho, skinparams, @startuml/@enduml etc.
+        kept.append(line)
+
+    if not found_class:
+        return compact_puml(puml)
+    return "\n".join(kept)
+
+
+def record_savings(stage, full_text, pruned_text, stats_path=os.path.join("data", STATS_FILE)):
+    """Imprime e registra a economia de tokens de contexto de uma etapa."""
+    full_tokens = count_tokens(full_text)
+    pruned_tokens = count_tokens(pruned_text)
+    saved = full_tokens - pruned_tokens
+    percent = (saved / full_tokens * 100) if full_tokens else 0.0
+
+    print(f"[CONTEXT] {stage}: {full_tokens} -> {pruned_tokens} tokens "
+          f"({saved} saved, {percent:.1f}%)")
+
+    stats = {}
+    if os.path.exists(stats_path):
+        try:
+            with open(stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            stats = {}
+    stats[stage] = {
+        "full_tokens": full_tokens,
+        "pruned_tokens": pruned_tokens,
+        "saved_tokens": saved,
+        "saved_percent": round(percent, 2),
+        "full_context": FULL_CONTEXT,
+    }
+    with open(stats_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+
+    return saved
+
+
+def build_context(stage, root, diagrams=None, scenario=None, data_dir="data"):
+    """
+    Monta o contexto de uma etapa.
+
+    Args:
+        stage: nome da etapa ("usecase", "classes", "sequence") ou seção do verify
+        root: root.json já carregado (None se a etapa não usa o JSON)
+        diagrams: dict {nome: conteúdo PlantUML} dos diagramas anteriores
+        scenario: texto do cenário (etapa de sequência), usado para podar o contexto
+        data_dir: diretório dos artefatos da execução (onde as estatísticas são salvas)
+
+    Returns:
+        dict com "root" e cada diagrama já serializados para o prompt
+    """
+    diagrams = diagrams or {}
+    full = {"root": full_json(root)} if root is not None else {}
+    full.update(diagrams)
+
+    if FULL_CONTEXT:
+        context = full
+    else:
+        context = {}
+        reached = None
+        if root is not None:
+            keys = STAGE_KEYS.get(stage, list(root.keys()))
+            if scenario:
+                sliced, reached = reachable_root(root, scenario, keys)
+                if len(reached) < MIN_REACHED:
+                    print(f"[CONTEXT] {stage}: scenario matched {len(reached)} element(s); "
+                          f"sending the full slice")
+                    reached = None
+            if reached is None:
+                sliced = slice_root(root, keys)
+            context["root"] = compact_json(sliced)
+
+        for name, puml in diagrams.items():
+            if name == "classes" and reached is not None:
+                context[name] = class_fragments(puml, reached)
+            else:
+                context[name] = compact_puml(puml)
+
+    record_savings(
+        stage, "\n".join(full.values()), "\n".join(context.values()),
+        os.path.join(data_dir, STATS_FILE),
+    )
+    return context
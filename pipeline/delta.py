@@ -0,0 +1,328 @@
+"""
+Regeneração incremental (por patch) dos diagramas PlantUML.
+
+Quando o root.json muda pouco (ex.: um ator ou uma relação a mais), pedir o
+diagrama inteiro de novo custa tokens de saída proporcionais ao tamanho do
+diagrama. No modo incremental (UML_DELTA=1 ou run_pipeline.py --delta), cada
+etapa compara o root.json atual com o usado na última geração do diagrama e
+pede à LLM apenas um patch de linhas para o diagrama existente:
+
+  - <linha>   remove a linha exata do diagrama atual
+  + <linha>   acrescenta a linha
+  @ <linha>   as linhas "+" seguintes entram logo depois desta linha do diagrama
+
+Linhas "-" e "@" precisam identificar uma única linha do diagrama. O patch é
+aplicado localmente e o resultado validado (delimitadores, chaves balanceadas,
+classes fora da mudança intactas); se não aplicar, não validar ou a mudança
+for grande demais, a etapa volta à geração completa. Sem mudança estrutural,
+o diagrama atual é mantido. O root.json usado em cada diagrama fica em
+delta_state.json e as decisões em delta_stats.json (só no modo incremental).
+"""
+
+import json
+import os
+import time
+
+from cache import content_hash
+from context import FULL_CONTEXT, STAGE_KEYS, compact_json
+from model import PARSERS, element_name, name_key
+from utils import call_llm_to_file
+
+
+DELTA = os.getenv("UML_DELTA") == "1"
+STATE_FILE = "delta_state.json"
+STATS_FILE = "delta_stats.json"
+
+ROOT_KEYS = ["actors", "entities", "events", "business_rules", "textual_relations"]
+# Acima desta fração de elementos alterados, o diagrama é gerado do zero
+MAX_CHANGE_RATIO = 0.3
+
+LABELS = {"usecase": "USE CASE", "classes": "CLASS", "sequence": "SEQUENCE"}
+
+
+class PatchError(ValueError):
+    """Patch inválido ou que não se aplica ao diagrama atual."""
+
+
+def element_key(key, element):
+    if key == "textual_relations" and isinstance(element, dict):
+        return (name_key(element.get("from", "")), name_key(element.get("to", "")),
+                name_key(element.get("action", "")))
+    return name_key(element_name(element))
+
+
+def diff_root(old, new, keys=ROOT_KEYS):
+    """
+    Diferença estrutural entre dois root.json, por chave:
+    {chave: {"added": [...], "removed": [...], "changed": [...]}} (só chaves alteradas).
+    """
+    diff = {}
+    for key in keys:
+        before = {element_key(key, e): e for e in old.get(key, [])}
+        after = {element_key(key, e): e for e in new.get(key, [])}
+        changes = {
+            "added": [e for k, e in after.items() if k not in before],
+            "removed": [e for k, e in before.items() if k not in after],
+            "changed": [e for k, e in after.items() if k in before and before[k] != e],
+        }
+        changes = {kind: elements for kind, elements in changes.items() if elements}
+        if changes:
+            diff[key] = changes
+    return diff
+
+
+def change_count(diff):
+    return sum(len(elements) for changes in diff.values() for elements in changes.values())
+
+
+def stage_keys(name):
+    return ROOT_KEYS if FULL_CONTEXT else STAGE_KEYS[name]
+
+
+def find_line(stripped, text, what):
+    """Índice da única linha igual a `text`; PatchError se não existir ou for ambígua."""
+    matches = [i for i, line in enumerate(stripped) if line == text.strip()]
+    if not matches:
+        raise PatchError(f"{what} not found: {text.strip()!r}")
+    if len(matches) > 1:
+        raise PatchError(f"{what} matches {len(matches)} lines: {text.strip()!r}")
+    return matches[0]
+
+
+def apply_patch(source, patch):
+    """Aplica um patch de linhas ("-", "+", "@") ao diagrama. Levanta PatchError."""
+    lines = source.strip().splitlines()
+    anchor = None  # índice após o qual entra o próximo "+"
+
+    for raw in patch.strip().splitlines():
+        if not raw.strip():
+            continue
+        op, text = raw[0], raw[1:]
+        text = text[1:] if text.startswith(" ") else text
+        stripped = [line.strip() for line in lines]
+
+        if op == "-":
+            index = find_line(stripped, text, "line to remove")
+            del lines[index]
+            if anchor is not None and anchor >= index:
+                anchor -= 1
+        elif op == "@":
+            anchor = find_line(stripped, text, "anchor line")
+        elif op == "+":
+            if text.strip() in ("@startuml", "@enduml"):
+                continue
+            if anchor is None:
+                ends = [i for i, line in enumerate(stripped) if line == "@enduml"]
+                lines.insert(ends[-1] if ends else len(lines), text)
+            else:
+                anchor += 1
+                lines.insert(anchor, text)
+        else:
+            raise PatchError(f"unknown patch instruction: {raw!r}")
+
+    return "\n".join(lines) + "\n"
+
+
+def brace_error(source):
+    """Verifica se as chaves do diagrama estão balanceadas. Retorna a mensagem de erro ou None."""
+    depth = 0
+    for number, line in enumerate(source.splitlines(), 1):
+        depth += line.count("{") - line.count("}")
+        if depth < 0:
+            return f"unbalanced '}}' at line {number}"
+    return f"{depth} unclosed '{{'" if depth else None
+
+
+def touched_texts(diff):
+    """Textos (normalizados por name_key) dos elementos citados na mudança."""
+    texts = []
+    for changes in diff.values():
+        for elements in changes.values():
+            for element in elements:
+                values = element.values() if isinstance(element, dict) else [element]
+                texts.extend(name_key(v) for v in values if isinstance(v, str))
+    return texts
+
+
+def touched(uml_class, texts):
+    """True se a mudança cita a classe (ex.: a entidade "Order" ou o evento "place order")."""
+    keys = {name_key(n) for n in (uml_class.name, uml_class.alias) if n}
+    return any(key and key in text for key in keys for text in texts)
+
+
+def validate_diagram(name, source, diff, previous):
+    """Valida o diagrama corrigido contra o anterior. Retorna a mensagem de erro ou None."""
+    text = source.strip()
+    if not text.startswith("@startuml") or not text.endswith("@enduml"):
+        return "diagram is not wrapped in @startuml/@enduml"
+    if text.count("@startuml") != 1 or text.count("@enduml") != 1:
+        return "diagram has more than one @startuml/@enduml"
+    if "```" in text:
+        return "diagram contains a Markdown code fence"
+    # Rótulos com chaves podem desbalancear o original; aí a contagem não diz nada
+    error = brace_error(text)
+    if error and not brace_error(previous):
+        return error
+
+    diagram = PARSERS[name](source)
+    if name == "usecase":
+        if not (diagram.actors or diagram.usecases):
+            return "use case diagram has no actors or use cases"
+        expected, present = "actors", diagram.get
+    elif name == "classes":
+        if not diagram.classes:
+            return "class diagram has no classes"
+        expected, present = "entities", diagram.get
+        # Classes que a mudança não cita devem continuar exatamente como estavam
+        texts = touched_texts(diff)
+        for before in PARSERS[name](previous).classes:
+            if touched(before, texts):
+                continue
+            after = diagram.get(before.name)
+            if after is None:
+                return f"class '{before.name}' is not part of the change but disappeared"
+            if (after.attributes, [m.signature for m in after.methods]) != \
+                    (before.attributes, [m.signature for m in before.methods]):
+                return f"class '{before.name}' is not part of the change but its members changed"
+    else:
+        return None if diagram.messages else "sequence diagram has no messages"
+
+    # Os elementos acrescentados/removidos no JSON devem aparecer/sumir no diagrama
+    for element in diff.get(expected, {}).get("added", []):
+        if present(element_name(element)) is None:
+            return f"added {expected[:-1]} '{element_name(element)}' is missing from the patched diagram"
+    for element in diff.get(expected, {}).get("removed", []):
+        if present(element_name(element)) is not None:
+            return f"removed {expected[:-1]} '{element_name(element)}' is still in the patched diagram"
+    return None
+
+
+def build_patch_prompt(name, source, diff):
+    sections = []
+    for key, changes in diff.items():
+        for kind, elements in changes.items():
+            sections.append(f"{kind.upper()} {key}: {compact_json(elements)}")
+    changes = "\n".join(sections)
+
+    return f"""
+You are updating an existing {LABELS[name]} diagram in PlantUML after a small change
+to the JSON of conceptual elements it was generated from.
+
+Current diagram:
+{source.strip()}
+
+Changes to the JSON:
+{changes}
+
+Return ONLY a patch to the current diagram, one instruction per line:
+- <line>    remove this exact line of the current diagram
++ <line>    add this line
+@ <line>    the following "+" lines are inserted right after this exact line of the current diagram
+"+" lines with no preceding "@" are inserted before @enduml.
+Every "-" and "@" line must match exactly one line of the current diagram: never use a line that
+appears more than once (such as a lone "}}"); to change a block, remove and re-add its unique lines.
+
+Change only what the JSON changes require, following the names and style already used in the diagram.
+Removed JSON elements must disappear from the diagram, together with their relationships.
+If nothing needs to change, return an empty response.
+
+DO NOT wrap the output in Markdown code fences.
+DO NOT use ``` or any code block delimiters.
+DO NOT repeat unchanged lines.
+"""
+
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def save_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def regenerate(name, model, data_dir, template, full):
+    """
+    Gera o diagrama `name` por patch quando possível; senão chama full().
+
+    Args:
+        name: "usecase", "classes" ou "sequence"
+        model: PipelineModel com o root atual
+        template: texto fixo do prompt completo (se mudar, o patch não é usado)
+        full: função sem argumentos que gera e grava o diagrama inteiro
+
+    Returns:
+        o PlantUML do diagrama
+    """
+    output_path = os.path.join(data_dir, f"{name}.puml")
+    if not DELTA:
+        return full()
+
+    state_path = os.path.join(data_dir, STATE_FILE)
+    state = load_json(state_path)
+    root = model.root.to_dict()
+    previous = state.get(name)
+    started = time.time()
+    current = None
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            current = f.read()
+
+    puml, mode, stats = None, "full", {}
+    if previous is None or current is None:
+        reason = "no previous diagram"
+    elif previous.get("template") != content_hash(template):
+        reason = "prompt changed"
+    elif previous.get("diagram") != content_hash(current):
+        # Gerado ou editado fora do modo incremental: o root registrado não corresponde mais
+        reason = "diagram changed since the last incremental run"
+    else:
+        diff = diff_root(previous["root"], root, stage_keys(name))
+        total = sum(len(root.get(key, [])) for key in stage_keys(name)) or 1
+        if not diff:
+            puml, mode = current, "unchanged"
+            print(f"[DELTA] {name}: no structural change, keeping the current diagram")
+        elif change_count(diff) / total > MAX_CHANGE_RATIO:
+            reason = f"{change_count(diff)} of {total} elements changed"
+        else:
+            patch = call_llm_to_file(build_patch_prompt(name, current, diff), stage=f"{name}.delta",
+                                     metrics_dir=data_dir)
+            try:
+                puml = apply_patch(current, patch)
+                error = validate_diagram(name, puml, diff, current)
+            except PatchError as e:
+                error = str(e)
+            if error:
+                puml = None
+                reason = f"patch rejected: {error}"
+            else:
+                mode = "patch"
+                patch_lines = sum(1 for line in patch.splitlines() if line.strip())
+                stats = {"changes": change_count(diff), "patch_lines": patch_lines,
+                         "diagram_lines": len(puml.splitlines()), "patch_chars": len(patch)}
+                with open(output_path, "w") as f:
+                    f.write(puml)
+                print(f"[DELTA] {name}: applied a {patch_lines}-line patch for {stats['changes']} "
+                      f"JSON changes instead of regenerating {stats['diagram_lines']} lines")
+
+    if puml is None:
+        print(f"[DELTA] {name}: full regeneration ({reason})")
+        puml = full()
+        stats = {"reason": reason, "diagram_lines": len(puml.splitlines())}
+
+    # O root usado neste diagrama é a base do próximo patch
+    state[name] = {"root": root, "template": content_hash(template), "diagram": content_hash(puml)}
+    save_json(state_path, state)
+    stats_path = os.path.join(data_dir, STATS_FILE)
+    all_stats = load_json(stats_path)
+    all_stats[name] = {"mode": mode, "seconds": round(time.time() - started, 3), **stats}
+    save_json(stats_path, all_stats)
+
+    return puml
@@ -1,10 +1,25 @@
-from utils import call_llm
+from utils import call_llm, call_llm_to_file, validate_json
+from model import PipelineModel
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import json
+import os
+import re
+import sys
 
 
-with open("data/study_case.txt") as f:
-    text = f.read()
+# Tamanho máximo (em caracteres) de cada pedaço no modo map-reduce
+CHUNK_CHARS = 6000
+# Número máximo de chamadas simultâneas à LLM no modo map-reduce
+MAX_WORKERS = 8
+# Modo map-reduce forçado (run_pipeline.py --chunked ou extractor.py --chunked)
+CHUNKED = os.getenv("UML_CHUNKED") == "1"
 
-prompt = f"""
+ROOT_KEYS = ["actors", "entities", "events", "business_rules", "textual_relations"]
+
+
+def build_prompt(text):
+    return f"""
 You are a formal extractor of textual semantics applied to software engineering.
 
 Your task is to analyze the text below and extract a structured set of conceptual elements that represent the described domain.
@@ -54,7 +69,117 @@ curly-braces
 {text}
 """
 
-output = call_llm(prompt)
 
-with open("data/root.json", "w") as f:
-    f.write(output)
+def split_chunks(text, max_chars=CHUNK_CHARS):
+    """
+    Divide o texto em pedaços respeitando os limites de parágrafo/seção.
+    Parágrafos são agrupados até max_chars; um parágrafo maior que o limite
+    forma um pedaço sozinho (nunca é cortado no meio).
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in paragraphs:
+        if current and size + len(paragraph) > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 2
+
+    if current:
+        chunks.append("\n\n".join(current))
+
+    return chunks
+
+
+def normalize_name(name):
+    """Normaliza um nome para comparação: caixa, espaços e pontuação nas pontas."""
+    return re.sub(r"\s+", " ", str(name)).strip().strip(".,;:!?\"'").casefold()
+
+
+def element_key(element):
+    """Chave de deduplicação de um elemento do root.json (string ou objeto)."""
+    if isinstance(element, dict):
+        if {"from", "to", "action"} <= element.keys():
+            return tuple(normalize_name(element[k]) for k in ("from", "to", "action"))
+        if "name" in element:
+            return normalize_name(element["name"])
+        return json.dumps(element, sort_keys=True, ensure_ascii=False).casefold()
+    return normalize_name(element)
+
+
+def merge_partials(partials):
+    """
+    Passo reduce: mescla os JSONs parciais na ordem dos pedaços,
+    mantendo a primeira ocorrência de cada elemento (resultado determinístico).
+    """
+    merged = {key: [] for key in ROOT_KEYS}
+    seen = {key: set() for key in ROOT_KEYS}
+
+    for partial in partials:
+        for key in ROOT_KEYS:
+            # Chaves ausentes ou null no JSON parcial contam como lista vazia
+            for element in partial.get(key) or []:
+                element_id = element_key(element)
+                if element_id in seen[key]:
+                    continue
+                seen[key].add(element_id)
+                merged[key].append(element)
+
+    return merged
+
+
+def extract_chunked(text, data_dir="data"):
+    """Passo map: extrai cada pedaço em paralelo e depois mescla os resultados."""
+    chunks = split_chunks(text)
+    if not chunks:
+        raise ValueError("study_case.txt is empty: there is no text to extract from")
+    print(f"[EXTRACT] {len(chunks)} chunk(s), largest with {max(len(c) for c in chunks)} chars")
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(chunks))) as executor:
+        # Cada chamada herda o contexto da etapa (modelo escolhido e registro de uso)
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, call_llm, build_prompt(chunk), stage="extractor.chunk",
+            )
+            for chunk in chunks
+        ]
+        outputs = [future.result() for future in futures]
+
+    partials = []
+    for i, output in enumerate(outputs, 1):
+        try:
+            partials.append(json.loads(output))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Chunk {i}/{len(chunks)} returned invalid JSON: {e}") from e
+
+    return json.dumps(merge_partials(partials), indent=2, ensure_ascii=False)
+
+
+def run(data_dir="data", model=None, chunked=False):
+    with open(os.path.join(data_dir, "study_case.txt")) as f:
+        text = f.read()
+
+    output_path = os.path.join(data_dir, "root.json")
+
+    # O modo map-reduce é ativado com --chunked ou automaticamente para textos longos
+    if chunked or CHUNKED or len(text) > CHUNK_CHARS:
+        output = extract_chunked(text, data_dir)
+        with open(output_path, "w") as f:
+            f.write(output)
+    else:
+        output = call_llm_to_file(
+            build_prompt(text), output_path,
+            stage="extractor", validate=validate_json, metrics_dir=data_dir,
+        )
+
+    model = model or PipelineModel()
+    model.set("root", output)
+
+    return model
+
+
+if __name__ == "__main__":
+    run(chunked="--chunked" in sys.argv)
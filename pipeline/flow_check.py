@@ -0,0 +1,209 @@
+"""
+Verificação determinística de fluxo e ordem de mensagens em diagramas de sequência.
+
+Substitui a LLM nos tipos de erro:
+  - "wrong_message_order" (json_vs_sequence): a ordem das mensagens contradiz
+    a ordem dos events/textual_relations do root.json;
+  - "incompatible_flow" (classes_vs_sequence): a mensagem liga classes sem
+    relação no diagrama de classes ou chama um método de outra classe.
+
+A ordem é verificada pela maior subsequência crescente (O(n log n)): mensagens
+fora dela são as que quebram a ordem esperada. Os candidatos de cada mensagem
+vêm só das palavras pouco frequentes nos eventos (ver best_match), para que o
+custo não cresça com mensagens x eventos em diagramas grandes.
+"""
+
+import re
+from bisect import bisect_right
+
+from model import name_key
+
+
+# Palavras presentes em mais eventos que isto (o maior dos dois limites) não geram
+# candidatos: em "create order X", "order" casaria a mensagem com todos os eventos
+COMMON_TOKEN_SHARE = 0.05
+COMMON_TOKEN_MIN = 20
+
+CAMEL_CASE = re.compile(r"([a-z0-9])([A-Z])")
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "the", "to", "of", "for", "and", "or", "in", "on", "by", "with", "from", "is", "his", "her"}
+
+
+def tokens(text):
+    """Palavras normalizadas de um identificador ou frase (separa camelCase)."""
+    text = CAMEL_CASE.sub(r"\1 \2", str(text))
+    words = WORD.findall(text.lower())
+    result = set()
+    for word in words:
+        if word in STOPWORDS:
+            continue
+        # Radical simples: places -> place, items -> item
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        result.add(word)
+    return result
+
+
+def build_token_index(items):
+    """Índice invertido palavra -> posições dos itens que a contêm."""
+    index = {}
+    for position, item_tokens in enumerate(items):
+        for token in item_tokens:
+            index.setdefault(token, []).append(position)
+    return index
+
+
+def best_match(message_tokens, items, index):
+    """Posição do item com maior sobreposição de palavras (Jaccard >= 0.5), ou None."""
+    limit = max(COMMON_TOKEN_MIN, int(len(items) * COMMON_TOKEN_SHARE))
+    postings = [index[token] for token in message_tokens if token in index]
+    rare = [positions for positions in postings if len(positions) <= limit]
+    # Só palavras comuns: os candidatos vêm da menos frequente delas
+    if not rare and postings:
+        rare = [min(postings, key=len)]
+    candidates = {position for positions in rare for position in positions}
+
+    best, best_score = None, 0.0
+    for position in candidates:
+        shared = len(message_tokens & items[position])
+        union = len(message_tokens | items[position])
+        score = shared / union if union else 0.0
+        # Todas as palavras da mensagem presentes no item também contam como casamento
+        if shared == len(message_tokens):
+            score = max(score, 0.5)
+        if score > best_score or (score == best_score and best is not None and position < best):
+            best, best_score = position, score
+
+    return best if best_score >= 0.5 else None
+
+
+def out_of_order(sequence):
+    """
+    Dada uma lista de (posição_esperada, item), devolve os itens fora da maior
+    subsequência não decrescente de posições esperadas.
+    """
+    if not sequence:
+        return []
+
+    tails = []          # menor posição final de uma subsequência de cada tamanho
+    tail_index = []     # índice em `sequence` dessa posição final
+    previous = [-1] * len(sequence)
+
+    for i, (expected, _) in enumerate(sequence):
+        size = bisect_right(tails, expected)
+        if size == len(tails):
+            tails.append(expected)
+            tail_index.append(i)
+        else:
+            tails[size] = expected
+            tail_index[size] = i
+        previous[i] = tail_index[size - 1] if size > 0 else -1
+
+    in_order = set()
+    i = tail_index[-1]
+    while i != -1:
+        in_order.add(i)
+        i = previous[i]
+
+    return [item for i, (_, item) in enumerate(sequence) if i not in in_order]
+
+
+def check_message_order(root, sequence):
+    """Erros "wrong_message_order" da seção json_vs_sequence."""
+    messages = [m for m in sequence.messages if not m.is_return]
+
+    relations = root.relations
+    relation_ends = {}
+    for relation in relations:
+        relation_ends.setdefault((name_key(relation.source), name_key(relation.target)), []).append(relation)
+
+    event_tokens = [tokens(event.name) for event in root.events]
+    event_index = build_token_index(event_tokens)
+
+    by_relation = []
+    by_event = []
+    for message in messages:
+        message_tokens = tokens(message.method or message.label)
+        if not message_tokens:
+            continue
+
+        # Relação textual com as mesmas pontas tem prioridade sobre eventos
+        candidates = relation_ends.get((name_key(message.sender), name_key(message.receiver)), [])
+        matched = [r for r in candidates if message_tokens & tokens(r.action)]
+        if matched:
+            by_relation.append((matched[0].position, (message, matched[0].action)))
+            continue
+
+        position = best_match(message_tokens, event_tokens, event_index)
+        if position is not None:
+            by_event.append((position, (message, root.events[position].name)))
+
+    errors = []
+    reported = set()
+    for source, sequence_items in (("textual_relations", by_relation), ("events", by_event)):
+        for message, expected in out_of_order(sequence_items):
+            if message.position in reported:
+                continue
+            reported.add(message.position)
+            errors.append({
+                "type": "wrong_message_order",
+                "element": message.label or f"{message.sender} -> {message.receiver}",
+                "details": (
+                    f"Message #{message.position + 1} ({message.sender} -> {message.receiver}) "
+                    f"maps to '{expected}', which the JSON {source} place in a different order"
+                ),
+            })
+    return errors
+
+
+def check_flow(classes, sequence):
+    """Erros "incompatible_flow" da seção classes_vs_sequence."""
+    errors = []
+
+    # Classe dona de cada método, para detectar chamadas ao destinatário errado
+    owners = {}
+    for uml_class in classes.classes:
+        for key in uml_class.method_index:
+            owners.setdefault(key, []).append(uml_class.name)
+
+    for message in sequence.messages:
+        if message.is_return:
+            continue
+        sender = classes.get(message.sender)
+        receiver = classes.get(message.receiver)
+        # Linhas de vida sem classe (atores, lifeline_without_class) ficam para as outras checagens
+        if sender is None or receiver is None or sender is receiver:
+            continue
+
+        element = message.label or f"{message.sender} -> {message.receiver}"
+        if not classes.related(sender.name, receiver.name):
+            errors.append({
+                "type": "incompatible_flow",
+                "element": element,
+                "details": (
+                    f"Message #{message.position + 1} goes from {sender.name} to {receiver.name}, "
+                    f"but the class diagram has no relationship between them"
+                ),
+            })
+            continue
+
+        method_key = name_key(message.method)
+        if method_key and not receiver.has_method(message.method) and method_key in owners:
+            errors.append({
+                "type": "incompatible_flow",
+                "element": element,
+                "details": (
+                    f"Message #{message.position + 1} calls {message.method} on {receiver.name}, "
+                    f"but the method belongs to {', '.join(owners[method_key])}"
+                ),
+            })
+
+    return errors
+
+
+def local_errors(model):
+    """Erros determinísticos por seção, no formato esperado pelo scoring."""
+    return {
+        "json_vs_sequence": check_message_order(model.root, model.sequence),
+        "classes_vs_sequence": check_flow(model.classes, model.sequence),
+    }
@@ -0,0 +1,462 @@
+"""
+Modelo UML tipado e compacto compartilhado entre as etapas do pipeline.
+
+Cada artefato (root.json, usecase.puml, classes.puml, sequence.puml) é lido e
+interpretado uma única vez; as etapas executadas no mesmo processo recebem o
+PipelineModel já montado em vez de reabrir e reinterpretar os arquivos.
+Todos os elementos são indexados por nome (name_key) para consultas O(1).
+As classes usam __slots__ (ver slotted), sem __dict__ por instância.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field, fields
+
+
+def name_key(name):
+    """Chave de comparação de nomes: ignora caixa, espaços e pontuação."""
+    return re.sub(r"\W+", "", str(name)).casefold()
+
+
+def element_name(element):
+    """Nome de um elemento do root.json (string ou objeto)."""
+    if isinstance(element, dict):
+        return element.get("name") or " ".join(str(v) for v in element.values())
+    return element
+
+
+def slotted(cls):
+    """
+    Recria a dataclass com __slots__, como @dataclass(slots=True), que só existe
+    a partir do Python 3.10. Os valores padrão ficam no __init__ gerado.
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = {key: value for key, value in cls.__dict__.items()
+                 if key not in names + ("__dict__", "__weakref__")}
+    namespace["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+def _unquote(name):
+    return name.strip().strip('"').strip()
+
+
+# Declarações de classificadores em diagramas de classes
+CLASS_DECL = re.compile(
+    r'^\s*(?:abstract\s+class|abstract|class|interface|enum|entity|actor)\s+'
+    r'(?:"([^"]+)"(?:\s+as\s+(\w+))?|(\w+))'
+)
+# Relações entre classes: A --> B, A "1" *-- "n" B, A <|-- B, A ..> B : label
+RELATION = re.compile(
+    r'^\s*("[^"]+"|\w+)\s*(?:"[^"]*"\s*)?[<|*o#x}+^]*[-.]+[|>*o#x{+^]*\s*(?:"[^"]*"\s*)?("[^"]+"|\w+)'
+)
+# Participantes de diagramas de sequência
+PARTICIPANT_DECL = re.compile(
+    r'^\s*(actor|participant|boundary|control|entity|database|collections|queue)\s+'
+    r'(?:"([^"]+)"(?:\s+as\s+([\w.]+))?|([\w.]+)(?:\s+as\s+([\w.]+))?)'
+)
+# Mensagens: A -> B : label, A --> B, A ->> B, B <- A, A -[#red]> B
+MESSAGE = re.compile(
+    r'^\s*("[^"]+"|[\w.]+)\s*(<<?)?(-{1,2})(?:\[[^\]]*\]-?)?(>>?|[x\\/]{1,2})?\s*'
+    r'("[^"]+"|[\w.]+)\s*(?::\s*(.*))?$'
+)
+# Atores e casos de uso em diagramas de casos de uso
+USECASE_ACTOR = re.compile(
+    r'^\s*(?:actor\s+(?:"([^"]+)"|:([^:]+):|([\w.]+))|:([^:]+):)(?:\s+as\s+([\w.]+))?'
+)
+USECASE_DECL = re.compile(r'^\s*usecase\s+(?:"([^"]+)"|\(([^)]+)\)|([\w.]+))(?:\s+as\s+([\w.]+))?')
+USECASE_INLINE = re.compile(r'\(([^()]+)\)(?:\s+as\s+([\w.]+))?')
+METHOD_NAME = re.compile(r'(\w+)\s*\(')
+
+
+# ---------------------------------------------------------------------------
+# root.json
+# ---------------------------------------------------------------------------
+
+@slotted
+@dataclass
+class Actor:
+    name: str
+
+
+@slotted
+@dataclass
+class Entity:
+    name: str
+
+
+@slotted
+@dataclass
+class Event:
+    name: str
+    position: int
+
+
+@slotted
+@dataclass
+class Rule:
+    text: str
+
+
+@slotted
+@dataclass
+class Relation:
+    source: str
+    target: str
+    action: str
+    position: int
+
+
+@slotted
+@dataclass
+class RootModel:
+    actors: list
+    entities: list
+    events: list
+    rules: list
+    relations: list
+    raw: dict
+    index: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data):
+        relations = [
+            Relation(str(r.get("from", "")), str(r.get("to", "")), str(r.get("action", "")), i)
+            for i, r in enumerate(data.get("textual_relations", []))
+            if isinstance(r, dict)
+        ]
+        model = cls(
+            actors=[Actor(str(element_name(a))) for a in data.get("actors", [])],
+            entities=[Entity(str(element_name(e))) for e in data.get("entities", [])],
+            events=[Event(str(element_name(e)), i) for i, e in enumerate(data.get("events", []))],
+            rules=[Rule(str(element_name(r))) for r in data.get("business_rules", [])],
+            relations=relations,
+            raw=data,
+        )
+        for element in model.actors + model.entities + model.events:
+            model.index.setdefault(name_key(element.name), element)
+        return model
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def get(self, name):
+        """Ator, entidade ou evento com o nome informado (ou None)."""
+        return self.index.get(name_key(name))
+
+    def to_dict(self):
+        return self.raw
+
+
+# ---------------------------------------------------------------------------
+# Diagrama de casos de uso
+# ---------------------------------------------------------------------------
+
+@slotted
+@dataclass
+class UseCase:
+    name: str
+    alias: str = None
+
+
+@slotted
+@dataclass
+class UseCaseDiagram:
+    actors: list
+    usecases: list
+    source: str
+    index: dict = field(default_factory=dict)
+
+    @classmethod
+    def parse(cls, source):
+        actors, usecases, index = [], [], {}
+
+        def add(collection, element, *names):
+            if any(name_key(n) in index for n in names if n):
+                return
+            collection.append(element)
+            for n in names:
+                if n:
+                    index[name_key(n)] = element
+
+        for line in source.splitlines():
+            match = USECASE_ACTOR.match(line)
+            if match:
+                quoted, colon, plain, bare, alias = match.groups()
+                name = quoted or colon or plain or bare
+                add(actors, Actor(name.strip()), name, alias)
+                continue
+
+            match = USECASE_DECL.match(line)
+            if match:
+                quoted, paren, plain, alias = match.groups()
+                name = (quoted or paren or plain).strip()
+                add(usecases, UseCase(name, alias), name, alias)
+                continue
+
+            for name, alias in USECASE_INLINE.findall(line):
+                add(usecases, UseCase(name.strip(), alias or None), name, alias)
+
+        return cls(actors, usecases, source, index)
+
+    def get(self, name):
+        return self.index.get(name_key(name))
+
+
+# ---------------------------------------------------------------------------
+# Diagrama de classes
+# ---------------------------------------------------------------------------
+
+@slotted
+@dataclass
+class Method:
+    name: str
+    signature: str
+
+
+@slotted
+@dataclass
+class UmlClass:
+    name: str
+    alias: str = None
+    attributes: list = field(default_factory=list)
+    methods: list = field(default_factory=list)
+    method_index: dict = field(default_factory=dict)
+
+    def add_member(self, line):
+        text = line.strip()
+        if not text or text.startswith(("'", "--", "..", "==", "__")):
+            return
+        match = METHOD_NAME.search(text)
+        if match:
+            method = Method(match.group(1), text)
+            self.methods.append(method)
+            self.method_index.setdefault(name_key(method.name), method)
+        else:
+            self.attributes.append(text)
+
+    def has_method(self, name):
+        return name_key(name) in self.method_index
+
+
+@slotted
+@dataclass
+class ClassRelation:
+    source: str
+    target: str
+    line: str
+
+
+@slotted
+@dataclass
+class ClassDiagram:
+    classes: list
+    relations: list
+    source: str
+    index: dict = field(default_factory=dict)
+    neighbours: dict = field(default_factory=dict)
+
+    @classmethod
+    def parse(cls, source):
+        diagram = cls([], [], source)
+        current = None
+        depth = 0
+
+        for line in source.splitlines():
+            stripped = line.strip()
+            if depth > 0:
+                depth += stripped.count("{") - stripped.count("}")
+                if current is not None and depth > 0:
+                    current.add_member(stripped)
+                continue
+
+            declaration = CLASS_DECL.match(stripped)
+            if declaration:
+                label, alias, plain = declaration.groups()
+                current = diagram.add_class((label or plain).strip(), alias)
+                depth = max(0, stripped.count("{") - stripped.count("}"))
+                # Membro na mesma linha: class A { +m() }
+                body = stripped.split("{", 1)[1].rsplit("}", 1)[0] if "{" in stripped else ""
+                if body.strip():
+                    current.add_member(body)
+                continue
+
+            if stripped.startswith("@"):
+                continue
+            relation = RELATION.match(stripped)
+            if relation:
+                source_name, target_name = (_unquote(g) for g in relation.groups())
+                diagram.add_relation(ClassRelation(source_name, target_name, stripped))
+                continue
+
+            # Membro declarado fora do corpo: A : +m()
+            if ":" in stripped:
+                owner, member = stripped.split(":", 1)
+                target = diagram.get(_unquote(owner))
+                if target is not None:
+                    target.add_member(member)
+
+        return diagram
+
+    def add_class(self, name, alias=None):
+        existing = self.get(name) or (self.get(alias) if alias else None)
+        if existing is not None:
+            return existing
+        uml_class = UmlClass(name, alias)
+        self.classes.append(uml_class)
+        for n in (name, alias):
+            if n:
+                self.index[name_key(n)] = uml_class
+        return uml_class
+
+    def add_relation(self, relation):
+        self.relations.append(relation)
+        source, target = name_key(relation.source), name_key(relation.target)
+        self.neighbours.setdefault(source, set()).add(target)
+        self.neighbours.setdefault(target, set()).add(source)
+
+    def get(self, name):
+        return self.index.get(name_key(name))
+
+    def related(self, first, second):
+        """True se há relação (em qualquer sentido) entre as duas classes."""
+        a, b = self.get(first), self.get(second)
+        keys_a = {name_key(n) for n in (a.name, a.alias) if n} if a else {name_key(first)}
+        keys_b = {name_key(n) for n in (b.name, b.alias) if n} if b else {name_key(second)}
+        return any(self.neighbours.get(k, set()) & keys_b for k in keys_a)
+
+
+# ---------------------------------------------------------------------------
+# Diagrama de sequência
+# ---------------------------------------------------------------------------
+
+@slotted
+@dataclass
+class Lifeline:
+    name: str
+    alias: str = None
+    kind: str = "participant"
+
+
+@slotted
+@dataclass
+class Message:
+    position: int
+    sender: str
+    receiver: str
+    label: str
+    method: str
+    is_return: bool
+    line_number: int
+
+
+@slotted
+@dataclass
+class SequenceDiagram:
+    lifelines: list
+    messages: list
+    source: str
+    index: dict = field(default_factory=dict)
+
+    @classmethod
+    def parse(cls, source):
+        diagram = cls([], [], source)
+
+        for line_number, line in enumerate(source.splitlines(), 1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith(("'", "@")):
+                continue
+
+            declaration = PARTICIPANT_DECL.match(stripped)
+            if declaration:
+                kind, quoted, quoted_alias, plain, plain_alias = declaration.groups()
+                diagram.add_lifeline(quoted or plain, quoted_alias or plain_alias, kind)
+                continue
+
+            match = MESSAGE.match(stripped)
+            if not match:
+                continue
+            left, head, shaft, tip, right, label = match.groups()
+            left, right = _unquote(left), _unquote(right)
+            sender, receiver = (right, left) if head and not tip else (left, right)
+            sender = diagram.add_lifeline(sender).name
+            receiver = diagram.add_lifeline(receiver).name
+
+            label = (label or "").strip()
+            method = METHOD_NAME.search(label)
+            diagram.messages.append(Message(
+                position=len(diagram.messages),
+                sender=sender,
+                receiver=receiver,
+                label=label,
+                method=method.group(1) if method else re.sub(r"^[\d.:\s]+", "", label),
+                is_return=len(shaft) == 2,
+                line_number=line_number,
+            ))
+
+        return diagram
+
+    def add_lifeline(self, name, alias=None, kind="participant"):
+        existing = self.get(name) or (self.get(alias) if alias else None)
+        if existing is not None:
+            return existing
+        lifeline = Lifeline(name.strip(), alias, kind)
+        self.lifelines.append(lifeline)
+        for n in (name, alias):
+            if n:
+                self.index[name_key(n)] = lifeline
+        return lifeline
+
+    def get(self, name):
+        return self.index.get(name_key(name))
+
+
+# ---------------------------------------------------------------------------
+# Modelo completo do pipeline
+# ---------------------------------------------------------------------------
+
+ARTIFACT_FILES = {
+    "root": "root.json",
+    "usecase": "usecase.puml",
+    "classes": "classes.puml",
+    "sequence": "sequence.puml",
+}
+
+PARSERS = {
+    "root": RootModel.from_json,
+    "usecase": UseCaseDiagram.parse,
+    "classes": ClassDiagram.parse,
+    "sequence": SequenceDiagram.parse,
+}
+
+
+@slotted
+@dataclass
+class PipelineModel:
+    """Artefatos já interpretados de uma execução, passados entre etapas."""
+    root: RootModel = None
+    usecase: UseCaseDiagram = None
+    classes: ClassDiagram = None
+    sequence: SequenceDiagram = None
+    sources: dict = field(default_factory=dict)
+    report: dict = None
+
+    def set(self, name, source):
+        """Interpreta e guarda um artefato a partir do seu texto."""
+        setattr(self, name, PARSERS[name](source))
+        self.sources[name] = source
+        return getattr(self, name)
+
+    def ensure(self, data_dir, *names):
+        """Carrega do disco apenas os artefatos ainda ausentes (fronteira do processo)."""
+        for name in names:
+            if getattr(self, name) is None:
+                with open(os.path.join(data_dir, ARTIFACT_FILES[name])) as f:
+                    self.set(name, f.read())
+        return self
+
+    @classmethod
+    def load(cls, data_dir="data", names=tuple(ARTIFACT_FILES)):
+        return cls().ensure(data_dir, *names)
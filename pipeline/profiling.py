@@ -0,0 +1,216 @@
+"""
+Profiling do pipeline por etapa.
+
+Cada etapa é executada sob cProfile e sob um amostrador de pilhas (em thread),
+que permite separar o tempo de parede em espera de rede e CPU e gera pilhas
+no formato "collapsed" (compatível com flamegraph.pl, speedscope, inferno).
+
+Arquivos gerados no diretório de profile (padrão: data/profile):
+  <etapa>.prof          estatísticas cProfile (pstats / snakeviz)
+  <etapa>.json          tempos da etapa (parede, CPU, rede, inicialização)
+  <etapa>.folded        pilhas amostradas da etapa
+  profile.folded        pilhas de todas as etapas (raiz = nome da etapa)
+  profile_summary.txt   resumo por etapa + funções mais custosas
+
+Modo subprocesso: python pipeline/profiling.py <script.py> <dir_profile> <etapa>
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+
+DEFAULT_DIR = "data/profile"
+SAMPLE_INTERVAL = 0.005  # segundos entre amostras de pilha
+TOP_FUNCTIONS = 15
+
+# Variável de ambiente com o instante (time.time) em que o processo filho foi criado
+SPAWN_ENV = "UML_PROFILE_SPAWN"
+
+# Folhas de pilha nesses módulos indicam espera de E/S de rede
+NETWORK_MARKERS = ("socket.py", "ssl.py", "selectors.py", "/_backends/", "connection.py")
+# Folhas nesses módulos indicam thread ociosa (ex.: worker de pool sem trabalho)
+IDLE_MARKERS = ("threading.py", "queue.py", "thread.py")
+
+
+class StackSampler(threading.Thread):
+    """Amostra periodicamente as pilhas de todas as threads do processo."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.ticks = 0
+        self.network_ticks = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop_event.is_set():
+            frames = sys._current_frames()
+            in_network = False
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                leaf = frame.f_code.co_filename
+                if any(marker in leaf for marker in IDLE_MARKERS):
+                    continue
+                if any(marker in leaf for marker in NETWORK_MARKERS):
+                    in_network = True
+
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                # Para nos quadros do próprio profiler (profile_stage e o que está abaixo dele)
+                while frame is not None and frame.f_code.co_filename != __file__:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, "thread"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+            self.ticks += 1
+            if in_network:
+                self.network_ticks += 1
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def profile_stage(name, func, profile_dir=DEFAULT_DIR, startup=None):
+    """
+    Executa func() sob cProfile e amostragem de pilhas e grava os resultados da etapa.
+
+    Args:
+        name: nome da etapa (usado nos nomes de arquivo e como raiz das pilhas)
+        func: função sem argumentos que executa a etapa
+        profile_dir: diretório de saída
+        startup: tempo de inicialização do interpretador (modo subprocesso), se conhecido
+
+    Returns:
+        o valor retornado por func()
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    sampler.start()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        sampler.stop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+        with open(os.path.join(profile_dir, f"{name}.folded"), "w") as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{name};{stack} {count}\n")
+
+        network_share = sampler.network_ticks / sampler.ticks if sampler.ticks else 0.0
+        timings = {
+            "stage": name,
+            "startup_s": round(startup, 4) if startup is not None else None,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "wait_s": round(max(0.0, wall - cpu), 4),
+            "network_wait_s": round(wall * network_share, 4),
+            "samples": sampler.ticks,
+        }
+        with open(os.path.join(profile_dir, f"{name}.json"), "w") as f:
+            json.dump(timings, f, indent=2)
+
+
+def top_functions(prof_path, limit=TOP_FUNCTIONS):
+    """Texto com as funções de maior tempo próprio (tottime) de um arquivo .prof."""
+    stream = io.StringIO()
+    stats = pstats.Stats(prof_path, stream=stream)
+    stats.strip_dirs().sort_stats("tottime").print_stats(limit)
+    lines = stream.getvalue().splitlines()
+    # Remove o cabeçalho do pstats até a tabela
+    for i, line in enumerate(lines):
+        if line.strip().startswith("ncalls"):
+            return "\n".join(lines[i:]).rstrip()
+    return ""
+
+
+def write_summary(stages, profile_dir=DEFAULT_DIR):
+    """
+    Consolida os resultados das etapas (na ordem informada) em
+    profile.folded e profile_summary.txt.
+    """
+    rows = []
+    with open(os.path.join(profile_dir, "profile.folded"), "w") as folded:
+        for name in stages:
+            json_path = os.path.join(profile_dir, f"{name}.json")
+            if not os.path.exists(json_path):
+                continue
+            with open(json_path) as f:
+                rows.append(json.load(f))
+            with open(os.path.join(profile_dir, f"{name}.folded")) as f:
+                folded.write(f.read())
+
+    lines = []
+    lines.append("=" * 80)
+    lines.append("PROFILE DO PIPELINE")
+    lines.append("=" * 80)
+    lines.append("")
+    lines.append(f"{'Etapa':<14}{'Startup':>10}{'Parede':>10}{'CPU':>10}{'Espera':>10}{'Rede':>10}")
+    for row in rows:
+        startup = f"{row['startup_s']:.3f}" if row["startup_s"] is not None else "-"
+        lines.append(
+            f"{row['stage']:<14}{startup:>10}{row['wall_s']:>10.3f}{row['cpu_s']:>10.3f}"
+            f"{row['wait_s']:>10.3f}{row['network_wait_s']:>10.3f}"
+        )
+    total_wall = sum(r["wall_s"] + (r["startup_s"] or 0) for r in rows)
+    total_network = sum(r["network_wait_s"] for r in rows)
+    total_cpu = sum(r["cpu_s"] for r in rows)
+    lines.append("")
+    lines.append(f"Total: {total_wall:.3f}s (CPU {total_cpu:.3f}s, rede ~{total_network:.3f}s)")
+    lines.append("Tempos em segundos. Espera = parede - CPU; Rede = fração amostrada em E/S de rede.")
+    lines.append("")
+
+    for row in rows:
+        lines.append("─" * 80)
+        lines.append(f"FUNÇÕES MAIS CUSTOSAS - {row['stage']}")
+        lines.append("─" * 80)
+        lines.append(top_functions(os.path.join(profile_dir, f"{row['stage']}.prof")))
+        lines.append("")
+
+    summary_path = os.path.join(profile_dir, "profile_summary.txt")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+    print("\n".join(lines[:len(rows) + 9]))
+    print(f"✓ Profile salvo em: {profile_dir} (flamegraph: profile.folded)")
+    return summary_path
+
+
+def main():
+    """Executa um script de etapa sob profiling (modo subprocesso)."""
+    script, profile_dir, name = sys.argv[1:4]
+    spawned = os.environ.get(SPAWN_ENV)
+    startup = time.time() - float(spawned) if spawned else None
+
+    # O script roda como __main__, com seu diretório no sys.path (como em "python script.py")
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    profile_stage(name, lambda: runpy.run_path(script, run_name="__main__"), profile_dir, startup)
+
+
+if __name__ == "__main__":
+    main()
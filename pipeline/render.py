@@ -1,11 +1,25 @@
+import threading
+
 import requests
 
+
+# Uma sessão por thread, reutilizada entre renderizações (mantém a conexão HTTP
+# com o Kroki aberta); requests.Session não é segura para uso entre threads
+_local = threading.local()
+
+
+def get_session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
 def render_with_kroki(input_path, output_path, format="png"):
     with open(input_path, "r", encoding="utf-8") as f:
         plantuml_code = f.read()
 
     url = f"https://kroki.io/plantuml/{format}"
-    response = requests.post(url, data=plantuml_code.encode("utf-8"))
+    response = get_session().post(url, data=plantuml_code.encode("utf-8"))
 
     if response.status_code != 200:
         raise RuntimeError(
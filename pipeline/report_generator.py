@@ -7,17 +7,28 @@ import json
 from datetime import datetime
 
 
-def generate_text_report(score_report_path, output_path="data/score_report.txt"):
+SECTION_NAMES = {
+    'json_vs_usecase': 'JSON ↔ Diagrama de Casos de Uso',
+    'json_vs_classes': 'JSON ↔ Diagrama de Classes',
+    'json_vs_sequence': 'JSON ↔ Diagrama de Sequência',
+    'usecase_vs_classes': 'Casos de Uso ↔ Classes',
+    'classes_vs_sequence': 'Classes ↔ Sequência'
+}
+
+
+def generate_text_report(score_report_path, output_path="data/score_report.txt", report=None):
     """
     Gera um relatório textual detalhado a partir do score_report.json.
     
     Args:
         score_report_path: Caminho para o arquivo score_report.json
         output_path: Caminho onde salvar o relatório .txt
+        report: Conteúdo já carregado do score_report.json (evita reler o arquivo)
     """
     # Carregar dados
-    with open(score_report_path, 'r', encoding='utf-8') as f:
-        report = json.load(f)
+    if report is None:
+        with open(score_report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
     
     scoring = report['scoring']
     config = report['config']
@@ -122,13 +133,7 @@ def generate_text_report(score_report_path, output_path="data/score_report.txt")
     lines.append("3. PESO DE CADA SEÇÃO NA AVALIAÇÃO FINAL")
     lines.append("─" * 80)
     lines.append("")
-    section_names = {
-        'json_vs_usecase': 'JSON ↔ Diagrama de Casos de Uso',
-        'json_vs_classes': 'JSON ↔ Diagrama de Classes',
-        'json_vs_sequence': 'JSON ↔ Diagrama de Sequência',
-        'usecase_vs_classes': 'Casos de Uso ↔ Classes',
-        'classes_vs_sequence': 'Classes ↔ Sequência'
-    }
+    section_names = SECTION_NAMES
     for section, weight in config['section_weights'].items():
         section_name = section_names.get(section, section)
         percentage = weight * 100
@@ -281,3 +286,100 @@ def generate_text_report(score_report_path, output_path="data/score_report.txt")
     print(f"✓ Relatório textual salvo em: {output_path}")
     
     return output_path
+
+
+def generate_aggregate_report(summary, output_path="data/aggregate_report.txt"):
+    """
+    Gera o relatório textual de um corpus a partir do resumo de aggregate.Aggregate.
+
+    Args:
+        summary: dict retornado por Aggregate.summary()
+        output_path: Caminho onde salvar o relatório .txt
+    """
+    lines = []
+
+    lines.append("=" * 80)
+    lines.append("RELATÓRIO AGREGADO DE VERIFICAÇÃO - DIAGRAMAS UML")
+    lines.append("=" * 80)
+    lines.append(f"Data de Geração: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    lines.append(f"Execuções Avaliadas: {summary['runs']}")
+    if summary['invalid']:
+        lines.append(f"Relatórios Ignorados (inválidos): {summary['invalid']}")
+    lines.append("")
+
+    if not summary['runs']:
+        lines.append("  Nenhum score_report.json válido encontrado.")
+        lines.append("")
+    else:
+        overall = summary['overall']
+
+        # Seção 1: Distribuição do Score Geral
+        lines.append("─" * 80)
+        lines.append("1. DISTRIBUIÇÃO DO SCORE GERAL")
+        lines.append("─" * 80)
+        lines.append("")
+        lines.append(f"  Média: {overall['mean']:.2f}  (desvio padrão {overall['stdev']:.2f})")
+        lines.append(f"  Mínimo: {overall['min']:.2f}  |  Máximo: {overall['max']:.2f}")
+        lines.append(f"  Percentis: p10 {overall['p10']:.1f} | p25 {overall['p25']:.1f} | "
+                     f"p50 {overall['p50']:.1f} | p75 {overall['p75']:.1f} | "
+                     f"p90 {overall['p90']:.1f} | p99 {overall['p99']:.1f}")
+        lines.append(f"  Aprovação: {summary['passed']}/{summary['runs']} ({summary['pass_rate']:.2f}%)")
+        lines.append("")
+        lines.append("  HISTOGRAMA:")
+        largest = max(overall['buckets'].values()) or 1
+        for bucket, count in overall['buckets'].items():
+            bar = "█" * round(count / largest * 40)
+            lines.append(f"  {bucket:>7} | {bar} {count}")
+        lines.append("")
+
+        # Seção 2: Notas
+        lines.append("─" * 80)
+        lines.append("2. DISTRIBUIÇÃO DAS NOTAS")
+        lines.append("─" * 80)
+        lines.append("")
+        for grade, count in summary['grades'].items():
+            percentage = count / summary['runs'] * 100
+            bar = "█" * int(percentage / 2.5)
+            lines.append(f"  {grade}: {count:>6} ({percentage:5.1f}%) {bar}")
+        lines.append("")
+
+        # Seção 3: Desempenho por Seção
+        lines.append("─" * 80)
+        lines.append("3. DESEMPENHO POR SEÇÃO")
+        lines.append("─" * 80)
+        lines.append("")
+        for section, data in summary['sections'].items():
+            section_name = SECTION_NAMES.get(section, section)
+            lines.append(f"┌─ {section_name}")
+            lines.append(f"│")
+            lines.append(f"│  Score Médio: {data['mean']:.2f}/100  (p10 {data['p10']:.1f} | "
+                         f"p50 {data['p50']:.1f} | p90 {data['p90']:.1f})")
+            lines.append(f"│  Execuções com Erros: {data['runs_with_errors']}/{data['count']}")
+            if data['error_types']:
+                lines.append(f"│")
+                lines.append(f"│  Tipos de Erro Mais Frequentes:")
+                for error_type, count in data['error_types'].items():
+                    lines.append(f"│    • {error_type}: {count}x")
+            lines.append(f"└{'─' * 78}")
+            lines.append("")
+
+        # Seção 4: Piores Casos
+        lines.append("─" * 80)
+        lines.append(f"4. PIORES CASOS ({len(summary['worst'])})")
+        lines.append("─" * 80)
+        lines.append("")
+        for i, case in enumerate(summary['worst'], 1):
+            lines.append(f"  {i:>2}. {case['overall_score']:6.2f} ({case['grade']}) - "
+                         f"{case['total_errors']} erros - {case['run']}")
+        lines.append("")
+
+    lines.append("=" * 80)
+    lines.append("FIM DO RELATÓRIO")
+    lines.append("=" * 80)
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+    print(f"✓ Relatório agregado salvo em: {output_path}")
+
+    return output_path
@@ -0,0 +1,36 @@
+from scoring import generate_report
+from archive import Archive
+import json
+import os
+import tempfile
+
+
+def run(data_dir="data"):
+    """
+    Recalcula scores e relatórios a partir da última verificação salva,
+    sem nenhuma chamada à LLM (usado quando apenas os pesos mudaram).
+    """
+    with open(os.path.join(data_dir, "report.json")) as f:
+        verification_result = json.load(f)
+
+    return generate_report(verification_result, os.path.join(data_dir, "score_report.json"))
+
+
+def run_archived(archive_path, run_ids=None):
+    """
+    Recalcula score_report.json/.txt de execuções arquivadas a partir do
+    report.json arquivado; as novas versões são acrescentadas ao arquivo.
+    """
+    with Archive(archive_path) as archive:
+        for run_id in run_ids or archive.runs():
+            verification_result = archive.read_json(run_id, "report.json")
+            with tempfile.TemporaryDirectory() as tmp:
+                report = generate_report(verification_result, os.path.join(tmp, "score_report.json"))
+                for name in ("score_report.json", "score_report.txt"):
+                    with open(os.path.join(tmp, name), "rb") as f:
+                        archive.replace(run_id, name, f.read())
+            archive.set_score(run_id, report["scoring"])
+
+
+if __name__ == "__main__":
+    run()
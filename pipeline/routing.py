@@ -0,0 +1,176 @@
+"""
+Roteamento de modelos por etapa, sensível a custo e latência.
+
+Cada etapa começa com o modelo mais rápido e barato da sua rota e só é
+promovida ao próximo modelo quando:
+  1) uma verificação local falha (resposta inválida, diagrama vazio...); ou
+  2) o score das seções do verify que avaliam a etapa fica abaixo do limite.
+
+As decisões, a taxa de escalonamento e o custo/latência da execução são
+gravados em routing_report.json.
+"""
+
+import json
+import os
+import time
+
+from scoring import calculate_section_score
+from utils import StreamAborted, llm_session
+
+
+ROUTING_REPORT_FILE = "routing_report.json"
+RERUN_REASON = "upstream changed"
+
+# Preço em USD por 1M de tokens: (entrada, saída)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Rota por etapa: modelos do mais barato ao mais forte, seções do verify que
+# avaliam a etapa e score mínimo aceito nessas seções
+ROUTES = {
+    "extractor": {"models": ["gpt-4o-mini", "gpt-4o"]},
+    "usecase": {"models": ["gpt-4o-mini", "gpt-4o"]},
+    "classes": {
+        "models": ["gpt-4o-mini", "gpt-4o"],
+        "sections": ["json_vs_classes", "usecase_vs_classes"],
+        "threshold": 70.0,
+    },
+    "sequence": {
+        "models": ["gpt-4o-mini", "gpt-4o"],
+        "sections": ["json_vs_sequence", "classes_vs_sequence"],
+        "threshold": 70.0,
+    },
+    "verify": {"models": ["gpt-4o-mini"]},
+}
+
+
+def local_check(stage, model):
+    """Verificação local barata da saída de uma etapa. Retorna a mensagem de erro ou None."""
+    if stage == "extractor":
+        if not (model.root.actors or model.root.entities):
+            return "root.json has no actors or entities"
+    elif stage in ("usecase", "classes", "sequence"):
+        source = model.sources[stage].strip()
+        if not source.startswith("@startuml") or not source.endswith("@enduml"):
+            return "diagram is not wrapped in @startuml/@enduml"
+        if stage == "usecase" and not (model.usecase.actors or model.usecase.usecases):
+            return "use case diagram has no actors or use cases"
+        if stage == "classes" and not model.classes.classes:
+            return "class diagram has no classes"
+        if stage == "sequence" and not model.sequence.messages:
+            return "sequence diagram has no messages"
+    return None
+
+
+def call_cost(call):
+    input_price, output_price = MODEL_PRICES.get(call["model"], (0.0, 0.0))
+    return (call["prompt_tokens"] * input_price + call["completion_tokens"] * output_price) / 1_000_000
+
+
+class Router:
+    def __init__(self, routes=ROUTES):
+        self.routes = routes
+        self.level = {stage: 0 for stage in routes}
+        self.reason = {stage: "initial" for stage in routes}
+        self.decisions = []
+        self.started = time.time()
+
+    def model_for(self, stage):
+        models = self.routes[stage]["models"]
+        return models[min(self.level[stage], len(models) - 1)]
+
+    def escalate(self, stage, reason):
+        """Promove a etapa ao próximo modelo da rota. False se já está no mais forte."""
+        if self.level[stage] + 1 >= len(self.routes[stage]["models"]):
+            return False
+        self.level[stage] += 1
+        self.reason[stage] = reason
+        return True
+
+    def run_stage(self, stage, func, data_dir, model):
+        """Executa a etapa com o modelo roteado, escalonando se a verificação local falhar."""
+        while True:
+            chosen = self.model_for(stage)
+            started = time.time()
+            with llm_session(chosen) as calls:
+                try:
+                    func(data_dir, model)
+                    error = local_check(stage, model)
+                except (ValueError, StreamAborted) as e:
+                    error = f"{type(e).__name__}: {e}"
+
+            self.decisions.append({
+                "stage": stage,
+                "model": chosen,
+                "reason": self.reason[stage],
+                "local_check": error or "OK",
+                "seconds": round(time.time() - started, 3),
+                "calls": len(calls),
+                "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+                "completion_tokens": sum(c["completion_tokens"] for c in calls),
+                "cost_usd": round(sum(call_cost(c) for c in calls), 6),
+            })
+            print(f"[ROUTE] {stage}: {chosen} ({self.reason[stage]}) -> {error or 'OK'}")
+            # Uma nova execução no mesmo nível só acontece se uma etapa anterior mudou
+            self.reason[stage] = RERUN_REASON
+
+            if error is None:
+                return
+            if not self.escalate(stage, f"local check failed: {error}"):
+                raise RuntimeError(f"{stage}: local check failed with the strongest model: {error}")
+
+    def score_escalation(self, verification, order):
+        """
+        Escalona as etapas cujas seções ficaram abaixo do limite.
+        Retorna a primeira etapa (na ordem do pipeline) a ser re-executada, ou None.
+        """
+        escalated = []
+        for stage in order:
+            route = self.routes.get(stage, {})
+            sections = [s for s in route.get("sections", []) if s in verification]
+            if not sections:
+                continue
+            scores = {s: calculate_section_score(verification[s])["score"] for s in sections}
+            worst = min(scores, key=scores.get)
+            if scores[worst] < route["threshold"]:
+                reason = f"score {worst}={scores[worst]} < {route['threshold']}"
+                if self.escalate(stage, reason):
+                    escalated.append(stage)
+        return escalated[0] if escalated else None
+
+    def summary(self):
+        runs = len(self.decisions)
+        escalations = sum(1 for d in self.decisions if d["reason"] not in ("initial", RERUN_REASON))
+        per_stage = {}
+        for decision in self.decisions:
+            stage = per_stage.setdefault(decision["stage"], {"runs": 0, "cost_usd": 0.0, "seconds": 0.0})
+            stage["runs"] += 1
+            stage["model"] = decision["model"]
+            stage["cost_usd"] = round(stage["cost_usd"] + decision["cost_usd"], 6)
+            stage["seconds"] = round(stage["seconds"] + decision["seconds"], 3)
+
+        return {
+            "decisions": self.decisions,
+            "per_stage": per_stage,
+            "stage_runs": runs,
+            "escalations": escalations,
+            "escalation_rate": round(escalations / runs, 4) if runs else 0.0,
+            "total_cost_usd": round(sum(d["cost_usd"] for d in self.decisions), 6),
+            "total_llm_seconds": round(sum(d["seconds"] for d in self.decisions), 3),
+            "wall_seconds": round(time.time() - self.started, 3),
+        }
+
+    def write_report(self, data_dir="data"):
+        summary = self.summary()
+        path = os.path.join(data_dir, ROUTING_REPORT_FILE)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"\n[ROUTE] {summary['stage_runs']} stage runs, {summary['escalations']} escalations "
+              f"({summary['escalation_rate'] * 100:.1f}%), cost ${summary['total_cost_usd']:.4f}, "
+              f"{summary['wall_seconds']}s")
+        for stage, data in summary["per_stage"].items():
+            print(f"  {stage}: {data['model']} x{data['runs']} - ${data['cost_usd']:.4f}, {data['seconds']}s")
+        return summary
@@ -0,0 +1,102 @@
+"""
+Execução das etapas do pipeline no mesmo processo.
+Os clientes da OpenAI e do Kroki são criados uma única vez na importação
+e reaproveitados entre execuções; cada execução usa seu próprio diretório.
+"""
+
+import os
+import time
+
+import extractor
+import usecase
+import classes
+import sequence
+import verify
+from model import PipelineModel
+from render import render_with_kroki
+
+
+STAGES = [
+    ("extractor", extractor.run),
+    ("usecase", usecase.run),
+    ("classes", classes.run),
+    ("sequence", sequence.run),
+    ("verify", verify.run),
+]
+
+DIAGRAMS = ["usecase", "classes", "sequence"]
+
+
+def render_diagrams(data_dir="data", diagrams_dir="diagrams"):
+    """Renderiza os três diagramas PlantUML em PNG via Kroki."""
+    os.makedirs(diagrams_dir, exist_ok=True)
+    for name in DIAGRAMS:
+        render_with_kroki(
+            os.path.join(data_dir, f"{name}.puml"),
+            os.path.join(diagrams_dir, f"{name}.png"),
+        )
+
+
+def run_stages(data_dir="data", model=None, on_event=None, router=None, wrap=None, start=None):
+    """
+    Executa todas as etapas em sequência, passando o mesmo PipelineModel adiante.
+
+    Args:
+        data_dir: diretório com study_case.txt, onde os artefatos são gravados
+        model: PipelineModel a completar (um novo é criado se None)
+        on_event: callback opcional chamado com um dict a cada início/fim de etapa
+        router: routing.Router opcional; escolhe o modelo de cada etapa e decide re-execuções
+        wrap: função opcional wrap(nome, func) que executa func() (ex.: profiling)
+        start: etapa inicial (as anteriores são lidas de data_dir); None executa todas
+
+    Returns:
+        o PipelineModel completo (model.report contém o score_report)
+    """
+    emit = on_event or (lambda event: None)
+    # O modelo é montado uma vez e passado adiante; cada etapa só grava seu artefato
+    model = model or PipelineModel()
+    names = [name for name, _ in STAGES]
+
+    i = names.index(start) if start else 0
+    while i < len(STAGES):
+        name, stage = STAGES[i]
+        emit({"stage": name, "status": "running"})
+        started = time.time()
+
+        if router is not None:
+            call = lambda: router.run_stage(name, stage, data_dir, model)  # noqa: E731
+        else:
+            call = lambda: stage(data_dir, model)  # noqa: E731
+        wrap(name, call) if wrap else call()
+
+        emit({"stage": name, "status": "done", "seconds": round(time.time() - started, 3)})
+        i += 1
+
+        # Score abaixo do limite: re-executa a partir da etapa escalonada
+        if router is not None and name == "verify":
+            rerun = router.score_escalation(model.report["verification"], names)
+            if rerun is not None:
+                i = names.index(rerun)
+
+    if router is not None:
+        router.write_report(data_dir)
+
+    return model
+
+
+def run_pipeline(data_dir="data", diagrams_dir="diagrams", on_event=None, router=None):
+    """
+    Executa todas as etapas e renderiza os diagramas.
+
+    Returns:
+        o relatório de scoring (mesmo conteúdo de score_report.json)
+    """
+    emit = on_event or (lambda event: None)
+    model = run_stages(data_dir, on_event=on_event, router=router)
+
+    emit({"stage": "render", "status": "running"})
+    started = time.time()
+    render_diagrams(data_dir, diagrams_dir)
+    emit({"stage": "render", "status": "done", "seconds": round(time.time() - started, 3)})
+
+    return model.report
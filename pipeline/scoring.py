@@ -3,6 +3,8 @@ Sistema de scoring determinístico para verificação de diagramas UML.
 Define pesos e calcula scores baseado nos erros identificados pela IA.
 """
 
+import os
+
 # Pesos por tipo de erro (0-100, quanto maior o peso, mais grave)
 ERROR_WEIGHTS = {
     # Erros críticos (25-30 pontos) - elementos fundamentais faltando
@@ -237,7 +239,8 @@ def generate_report(verification_result, output_file="data/score_report.json"):
     # Gerar relatório textual detalhado
     try:
         from report_generator import generate_text_report
-        generate_text_report(output_file, "data/score_report.txt")
+        text_file = os.path.splitext(output_file)[0] + ".txt"
+        generate_text_report(output_file, text_file, report=report)
     except Exception as e:
         print(f"⚠ Erro ao gerar relatório textual: {e}")
     
@@ -1,22 +1,24 @@
-from utils import call_llm
-import json
+from utils import call_llm_to_file, validate_puml
+from context import build_context
+from model import PipelineModel
+from delta import regenerate
+from collections import defaultdict
+import os
 
 
-with open("data/root.json") as f:
-    root = json.load(f)
-
-usecase = open("data/usecase.puml").read()
-classes = open("data/classes.puml").read()
-
-prompt = f"""
-Consider the following use case scenario (for use case “place order”):
-Use case scenario — “place order”:
+SCENARIO = """Use case scenario — “place order”:
 Ali is an existing customer of the order processing company described earlier, registered with their website. Also assume that, having browsed the printed catalogue he owns, he has already identified the two items (including their prices) he wants to buy from the company’s website using their product numbers (i.e., #2 and #9).
 First, he tries to buy one unit of product #2, but it is listed as unavailable in the inventory.
 Then, he adds two units of product #9, which turns out to be available, to his basket.
 He is then asked to confirm his registered shipping and billing addresses and credit card information from the customer database.
 He completes the order by clicking the Submit button.
-You may ignore customer authentication processing.
+You may ignore customer authentication processing."""
+
+
+def build_prompt(context):
+    return f"""
+Consider the following use case scenario (for use case “place order”):
+{SCENARIO}
 
 Generate a SEQUENCE diagram in PlantUML based EXCLUSIVELY on the above scenario and the input, which consists of:
 
@@ -52,13 +54,13 @@ Use ONLY the methods already present in the class diagram.
 5) Preserve all names exactly as they appear.
 
 JSON:
-{json.dumps(root, indent=2)}
+{context['root']}
 
 Use case diagram:
-{usecase}
+{context['usecase']}
 
 Class diagram:
-{classes}
+{context['classes']}
 
 The final result must be a valid UML diagram in PlantUML, with no additional explanations or comments.
 
@@ -67,7 +69,26 @@ DO NOT use ``` or any code block delimiters.
 Return ONLY a valid PlantUML code.
 """
 
-puml = call_llm(prompt)
 
-with open("data/sequence.puml", "w") as f:
-    f.write(puml)
\ No newline at end of file
+def run(data_dir="data", model=None):
+    model = (model or PipelineModel()).ensure(data_dir, "root", "usecase", "classes")
+    context = build_context(
+        "sequence", model.root.to_dict(),
+        {"usecase": model.sources["usecase"], "classes": model.sources["classes"]},
+        scenario=SCENARIO, data_dir=data_dir,
+    )
+
+    puml = regenerate(
+        "sequence", model, data_dir, build_prompt(defaultdict(str)),
+        lambda: call_llm_to_file(
+            build_prompt(context), os.path.join(data_dir, "sequence.puml"),
+            stage="sequence", validate=validate_puml, metrics_dir=data_dir,
+        ),
+    )
+    model.set("sequence", puml)
+
+    return model
+
+
+if __name__ == "__main__":
+    run()
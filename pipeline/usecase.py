@@ -1,15 +1,18 @@
-from utils import call_llm
-import json
+from utils import call_llm_to_file, validate_puml
+from context import build_context
+from model import PipelineModel
+from delta import regenerate
+from collections import defaultdict
+import os
 
 
-root = json.load(open("data/root.json", "r"))
-
-prompt = f"""
+def build_prompt(context):
+    return f"""
 Generate a USE CASE diagram in PlantUML based EXCLUSIVELY on the JSON below.
 DO NOT add new elements.
 
 JSON:
-{json.dumps(root, indent=2)}
+{context['root']}
 
 The final result must be a valid UML diagram in PlantUML, with no additional explanations or comments.
 
@@ -18,6 +21,22 @@ DO NOT use ``` or any code block delimiters.
 Return ONLY a valid PlantUML code.
 """
 
-puml = call_llm(prompt)
 
-open("data/usecase.puml", "w").write(puml)
\ No newline at end of file
+def run(data_dir="data", model=None):
+    model = (model or PipelineModel()).ensure(data_dir, "root")
+    context = build_context("usecase", model.root.to_dict(), data_dir=data_dir)
+
+    puml = regenerate(
+        "usecase", model, data_dir, build_prompt(defaultdict(str)),
+        lambda: call_llm_to_file(
+            build_prompt(context), os.path.join(data_dir, "usecase.puml"),
+            stage="usecase", validate=validate_puml, metrics_dir=data_dir,
+        ),
+    )
+    model.set("usecase", puml)
+
+    return model
+
+
+if __name__ == "__main__":
+    run()
@@ -1,21 +1,361 @@
+import contextvars
+import hashlib
+import json
 import os
+import threading
+import time
+import types
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from budget import MAX_CONTINUATIONS, continuation_cost, continuation_messages, plan, record, retry_budget
+from context import count_tokens
+
 
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def call_llm(prompt, model="gpt-4o-mini", max_tokens=2000):
+# Com UML_STREAM=1 as etapas consomem a resposta em streaming (ver call_llm_to_file)
+STREAM = os.getenv("UML_STREAM") == "1"
+STREAM_METRICS_FILE = "stream_metrics.json"
+# As seções do verify rodam em paralelo e todas gravam no mesmo arquivo de métricas
+_metrics_lock = threading.Lock()
+
+# Quantos caracteres iniciais da resposta são usados para validar o formato
+VALIDATION_PREFIX = 64
+
+DEFAULT_MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.1  # Controla o grau de criatividade. Devemos deixar rígido assim?
+
+# Modelo e registro de uso da etapa corrente (ver llm_session); propagados por contexto
+_session_model = contextvars.ContextVar("uml_session_model", default=None)
+_session_usage = contextvars.ContextVar("uml_session_usage", default=None)
+# Modo batch (ver batch.py): respostas já obtidas e requisições a enviar
+_batch = contextvars.ContextVar("uml_batch", default=None)
+
+
+class StreamAborted(RuntimeError):
+    """Resposta interrompida antes do fim por ser claramente inválida."""
+
+
+class BatchPending(RuntimeError):
+    """Requisição registrada para o próximo batch; a resposta ainda não existe."""
+
+
+@contextmanager
+def llm_session(model=None):
+    """
+    Define o modelo usado pelas chamadas feitas dentro do bloco e registra
+    o uso de cada uma (modelo, tokens, duração) na lista devolvida.
+    """
+    usage = []
+    model_token = _session_model.set(model)
+    usage_token = _session_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _session_model.reset(model_token)
+        _session_usage.reset(usage_token)
+
+
+@contextmanager
+def batch_session(results, requests):
+    """
+    Dentro do bloco, as chamadas à LLM não vão à API: cada uma devolve a resposta
+    já presente em `results` ou registra a requisição em `requests` e levanta
+    BatchPending. As chaves são request_key(model, messages).
+    """
+    token = _batch.set((results, requests))
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+
+
+def request_key(model, messages):
+    data = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def resolve_model(model=None):
+    return model or _session_model.get() or DEFAULT_MODEL
+
+
+def record_usage(model, usage, seconds, key=None):
+    log = _session_usage.get()
+    if log is None:
+        return
+    entry = {
+        "model": model,
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) if usage else 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) if usage else 0,
+        "seconds": round(seconds, 3),
+    }
+    # No modo batch, a chave da requisição (casos idênticos compartilham a resposta)
+    if key:
+        entry["request"] = key
+    log.append(entry)
+
+
+def complete(messages, model, max_tokens):
+    """Uma chamada à LLM. Retorna (texto, finish_reason, tokens de saída)."""
+    if _batch.get() is not None:
+        return complete_from_batch(messages, model, max_tokens)
+
+    started = time.time()
     response = client.chat.completions.create(
         model=model,
         # O parâmetro messages é uma lista com o histórico da conversa
         # Como queremos recomeçar sempre da saída anterior gerada pela LLM, não mantemos o histórico
-        messages=[{"role": "user", "content": prompt}],
+        # (exceto ao continuar uma resposta cortada; ver continue_truncated)
+        messages=messages,
         max_tokens=max_tokens,
-        temperature=0.1 # Controla o grau de criatividade. Devemos deixar rígido assim?
+        temperature=TEMPERATURE
     )
+    usage = getattr(response, "usage", None)
+    record_usage(model, usage, time.time() - started)
     # O modelo retorna a(s) resposta(s) em uma lista
     # O parâmetro n, que controla o número de respostas, é configurado com 1 por padrão
-    return response.choices[0].message.content
+    choice = response.choices[0]
+    content = choice.message.content or ""
+    tokens = getattr(usage, "completion_tokens", None) if usage else None
+    return content, getattr(choice, "finish_reason", None), tokens if tokens is not None else count_tokens(content)
+
+
+def complete_from_batch(messages, model, max_tokens):
+    results, requests = _batch.get()
+    key = request_key(model, messages)
+    if key not in results:
+        requests[key] = {"model": model, "messages": messages, "max_tokens": max_tokens,
+                         "temperature": TEMPERATURE}
+        raise BatchPending(key)
+
+    body = results[key]
+    if "error" in body:
+        raise RuntimeError(f"batch request failed: {body['error']}")
+    usage = body.get("usage") or {}
+    record_usage(model, types.SimpleNamespace(**usage), 0.0, key)
+    choice = body["choices"][0]
+    content = choice["message"].get("content") or ""
+    return content, choice.get("finish_reason"), usage.get("completion_tokens", count_tokens(content))
+
+
+def continue_truncated(prompt, partial, partial_tokens, model, max_tokens, stage="llm", input_tokens=None):
+    """
+    Completa uma resposta cortada por limite de tokens pedindo apenas o restante.
+    Cada continuação reenvia o prompt e a parte já gerada; passados os limites de
+    budget.continuation_cost, a pergunta é refeita uma vez com orçamento maior.
+    Retorna (resposta completa, tokens de saída, continuações usadas, tokens de entrada reenviados).
+    """
+    input_tokens = input_tokens if input_tokens is not None else count_tokens(prompt)
+    parts = [partial]
+    tokens = partial_tokens
+    spent = 0
+    attempt = 0
+    while True:
+        attempt += 1
+        cost = continuation_cost(input_tokens, spent, "".join(parts), attempt)
+        if cost is None:
+            break
+        spent += cost
+        print(f"[BUDGET] {stage}: response truncated at {max_tokens} tokens, "
+              f"continuing ({attempt}/{MAX_CONTINUATIONS})")
+        content, finish_reason, used = complete(continuation_messages(prompt, "".join(parts)), model, max_tokens)
+        parts.append(content)
+        tokens += used
+        if finish_reason != "length":
+            return "".join(parts), tokens, attempt, spent
+
+    # Limite de continuações atingido: uma nova chamada, com espaço para a resposta inteira
+    retry_tokens = retry_budget(model, input_tokens, tokens)
+    print(f"[BUDGET] {stage}: continuation limit reached after {tokens} tokens, "
+          f"asking again with max_tokens={retry_tokens}")
+    output, finish_reason, used = complete([{"role": "user", "content": prompt}], model, retry_tokens)
+    if finish_reason == "length":
+        raise ValueError(f"{stage}: response still truncated at {retry_tokens} tokens")
+    return output, used, attempt - 1, spent + input_tokens
+
+
+def call_llm(prompt, model=None, max_tokens=None, stage="llm"):
+    """
+    Chama a LLM com max_tokens dimensionado pelo histórico da etapa (ver budget.py);
+    respostas cortadas por limite são continuadas em vez de refeitas.
+    """
+    model = resolve_model(model)
+    input_tokens, budget = plan(prompt, stage, model)
+    max_tokens = max_tokens or budget
+
+    output, finish_reason, tokens = complete([{"role": "user", "content": prompt}], model, max_tokens)
+    continuations = spent = 0
+    if finish_reason == "length":
+        output, tokens, continuations, spent = continue_truncated(
+            prompt, output, tokens, model, max_tokens, stage, input_tokens
+        )
+
+    record(stage, model, input_tokens, tokens, max_tokens, continuations, spent)
+    return output
+
+
+def validate_puml(prefix):
+    """Valida o início de uma resposta PlantUML. Retorna a mensagem de erro ou None."""
+    text = prefix.lstrip()
+    marker = "@startuml"
+    if len(text) >= len(marker):
+        return None if text.startswith(marker) else "response does not start with @startuml"
+    return None if marker.startswith(text) else "response does not start with @startuml"
+
+
+def validate_json(prefix):
+    """Valida o início de uma resposta JSON. Retorna a mensagem de erro ou None."""
+    text = prefix.lstrip()
+    if text and not text.startswith("{"):
+        return "response is not a JSON object"
+    return None
+
+
+def record_stream_metrics(stage, metrics, metrics_dir="data"):
+    """Acrescenta as métricas de streaming de uma etapa em stream_metrics.json."""
+    path = os.path.join(metrics_dir, STREAM_METRICS_FILE)
+    with _metrics_lock:
+        data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                data = {}
+        data[stage] = metrics
+        # Gravação atômica: quem lê o arquivo nunca vê um JSON pela metade
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def stream_llm(prompt, output_path=None, stage="llm", validate=None,
+               model=None, max_tokens=None, metrics_dir="data"):
+    """
+    Consome a resposta em streaming, gravando-a progressivamente em
+    <output_path>.part e renomeando para output_path ao final.
+
+    A resposta é abortada assim que se mostra inválida: cerca de código
+    Markdown (```) em qualquer ponto ou prefixo recusado por `validate`.
+    Registra time-to-first-token e tokens/segundo da etapa.
+    """
+    model = resolve_model(model)
+    input_tokens, budget = plan(prompt, stage, model)
+    max_tokens = max_tokens or budget
+    finish_reason = None
+    started = time.time()
+    first_token = None
+    parts = []
+    usage = None
+    prefix = ""
+    tail = ""
+    completion_tokens = None
+    chunk_count = 0
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=TEMPERATURE,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+
+    temp_path = output_path + ".part" if output_path else None
+    out = open(temp_path, "w") if temp_path else None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+                completion_tokens = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+
+            if first_token is None:
+                first_token = time.time()
+            chunk_count += 1
+            parts.append(delta)
+            if out:
+                out.write(delta)
+                out.flush()
+
+            # Verificações baratas: só o prefixo e a emenda entre pedaços são examinados
+            error = None
+            if "```" in tail + delta:
+                error = "response contains a Markdown code fence"
+            elif validate and len(prefix) < VALIDATION_PREFIX:
+                prefix = (prefix + delta)[:VALIDATION_PREFIX]
+                error = validate(prefix)
+            tail = (tail + delta)[-2:]
+
+            if error:
+                stream.close()
+                raise StreamAborted(f"{stage}: {error} (after {time.time() - started:.1f}s)")
+
+        # Resposta cortada por limite: só o restante é pedido (sem streaming)
+        continuations = spent = 0
+        if finish_reason == "length":
+            streamed = "".join(parts)
+            output, completion_tokens, continuations, spent = continue_truncated(
+                prompt, streamed, completion_tokens if completion_tokens is not None else chunk_count,
+                model, max_tokens, stage, input_tokens,
+            )
+            parts = [output]
+            if out:
+                # A resposta pode ter sido refeita do zero (ver continue_truncated)
+                if output.startswith(streamed):
+                    out.write(output[len(streamed):])
+                else:
+                    out.seek(0)
+                    out.truncate()
+                    out.write(output)
+    except BaseException:
+        if out:
+            out.close()
+            os.remove(temp_path)
+        raise
+
+    if out:
+        out.close()
+        os.replace(temp_path, output_path)
+
+    finished = time.time()
+    record_usage(model, usage, finished - started)
+    tokens = completion_tokens if completion_tokens is not None else chunk_count
+    record(stage, model, input_tokens, tokens, max_tokens, continuations, spent)
+    generation_time = finished - (first_token or finished)
+    metrics = {
+        "ttft_s": round((first_token or finished) - started, 3),
+        "total_s": round(finished - started, 3),
+        "completion_tokens": tokens,
+        "tokens_per_s": round(tokens / generation_time, 2) if generation_time > 0 else None,
+    }
+    print(f"[STREAM] {stage}: TTFT {metrics['ttft_s']}s, {tokens} tokens, "
+          f"{metrics['tokens_per_s']} tokens/s")
+    record_stream_metrics(stage, metrics, metrics_dir)
+
+    return "".join(parts)
+
+
+def call_llm_to_file(prompt, output_path=None, stage="llm", validate=None, metrics_dir="data"):
+    """
+    Chama a LLM e grava a resposta em output_path (se informado).
+    Usa streaming quando UML_STREAM=1; caso contrário, chamada bloqueante.
+    """
+    if STREAM and _batch.get() is None:
+        return stream_llm(prompt, output_path, stage, validate, metrics_dir=metrics_dir)
+
+    output = call_llm(prompt, stage=stage)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    return output
@@ -1,22 +1,79 @@
-from utils import call_llm
+from utils import BatchPending, call_llm_to_file, resolve_model, validate_json
 from scoring import generate_report
+from cache import content_hash, section_key, load_cache, save_cache
+from context import FULL_CONTEXT, build_context
+from model import ARTIFACT_FILES, PipelineModel
+from flow_check import local_errors
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import json
-
-
-with open("data/root.json") as f:
-    root = json.load(f)
-
-usecase = open("data/usecase.puml").read()
-classes = open("data/classes.puml").read()
-sequence = open("data/sequence.puml").read()
-
-prompt = f"""
+import os
+
+
+CACHE_FILE = "verify_cache.json"
+MAX_WORKERS = 5
+
+# Artefatos disponíveis para verificação e como são apresentados no prompt
+ARTIFACTS = {
+    "root.json": "JSON",
+    "usecase.puml": "Use case diagram",
+    "classes.puml": "Class diagram",
+    "sequence.puml": "Sequence diagram",
+}
+
+# Cada seção compara exatamente dois artefatos.
+# "wrong_message_order" e "incompatible_flow" são verificados localmente (flow_check.py).
+SECTIONS = {
+    "json_vs_usecase": {
+        "artifacts": ("root.json", "usecase.puml"),
+        "errors": """- "missing_actor": Actor from JSON not in use case
+- "extra_actor": Actor in use case not in JSON
+- "missing_usecase": Event from JSON not mapped to use case
+- "extra_usecase": Use case not in JSON events""",
+        "counts": ["total_actors_json", "found_actors_usecase", "total_events_json", "found_usecases"],
+    },
+    "json_vs_classes": {
+        "artifacts": ("root.json", "classes.puml"),
+        "errors": """- "missing_entity": Entity from JSON not as class
+- "extra_class": Class not in JSON entities
+- "missing_relation": JSON relation not in class diagram
+- "missing_method": JSON event not mapped to method""",
+        "counts": ["total_entities_json", "found_classes", "total_relations_json", "found_relations"],
+    },
+    "json_vs_sequence": {
+        "artifacts": ("root.json", "sequence.puml"),
+        "errors": """- "missing_participant": Actor/Entity not in sequence
+- "extra_participant": Participant not in JSON
+- "missing_message": Event not as message""",
+        "counts": ["total_participants_expected", "found_participants", "total_events_json", "found_messages"],
+    },
+    "usecase_vs_classes": {
+        "artifacts": ("usecase.puml", "classes.puml"),
+        "errors": """- "usecase_not_mapped": Use case without method
+- "method_without_usecase": Method without use case""",
+        "counts": ["total_usecases", "found_methods"],
+    },
+    "classes_vs_sequence": {
+        "artifacts": ("classes.puml", "sequence.puml"),
+        "errors": """- "lifeline_without_class": Lifeline without class
+- "message_without_method": Message without method""",
+        "counts": ["total_lifelines", "valid_lifelines", "total_messages", "valid_messages"],
+    },
+}
+
+
+def build_instructions(section_name):
+    """Parte fixa do prompt de uma seção (sem o conteúdo dos artefatos)."""
+    section = SECTIONS[section_name]
+    counts = ",\n".join(f'    "{name}": number' for name in section["counts"])
+
+    return f"""
 You are a FORMAL CONSISTENCY VERIFIER for UML models.
 
-Your task is to identify and categorize ALL inconsistencies between artifacts.
+Your task is to identify and categorize ALL inconsistencies between TWO artifacts of a pipeline.
 DO NOT evaluate severity - just report what you find objectively.
 
-# ARTIFACTS TO ANALYZE
+# PIPELINE CONTEXT
 
 The pipeline consists of:
 1) A JSON extracted from case study text
@@ -24,6 +81,8 @@ The pipeline consists of:
 3) A CLASS DIAGRAM derived from JSON + use case
 4) A SEQUENCE DIAGRAM derived from JSON + classes + use case
 
+In this check you compare ONLY: {" and ".join(ARTIFACTS[a] for a in section["artifacts"])}.
+
 # RULES
 
 You MUST:
@@ -40,118 +99,128 @@ You MUST NOT:
 
 # ERROR TYPES YOU CAN REPORT
 
-For json_vs_usecase:
-- "missing_actor": Actor from JSON not in use case
-- "extra_actor": Actor in use case not in JSON
-- "missing_usecase": Event from JSON not mapped to use case
-- "extra_usecase": Use case not in JSON events
-
-For json_vs_classes:
-- "missing_entity": Entity from JSON not as class
-- "extra_class": Class not in JSON entities
-- "missing_relation": JSON relation not in class diagram
-- "missing_method": JSON event not mapped to method
-
-For json_vs_sequence:
-- "missing_participant": Actor/Entity not in sequence
-- "extra_participant": Participant not in JSON
-- "missing_message": Event not as message
-- "wrong_message_order": Order contradicts JSON
-
-For usecase_vs_classes:
-- "usecase_not_mapped": Use case without method
-- "method_without_usecase": Method without use case
-
-For classes_vs_sequence:
-- "lifeline_without_class": Lifeline without class
-- "message_without_method": Message without method
-- "incompatible_flow": Flow incompatible with classes
+{section["errors"]}
 
 # OUTPUT FORMAT
 
 Return ONLY valid JSON:
 
 {{
-  "json_vs_usecase": {{
-    "status": "OK" or "ERROR",
-    "errors": [
-      {{
-        "type": "one of the types above",
-        "element": "element name",
-        "details": "brief description"
-      }}
-    ],
-    "counts": {{
-      "total_actors_json": number,
-      "found_actors_usecase": number,
-      "total_events_json": number,
-      "found_usecases": number
-    }}
-  }},
-  "json_vs_classes": {{
-    "status": "OK" or "ERROR",
-    "errors": [...],
-    "counts": {{
-      "total_entities_json": number,
-      "found_classes": number,
-      "total_relations_json": number,
-      "found_relations": number
-    }}
-  }},
-  "json_vs_sequence": {{
-    "status": "OK" or "ERROR",
-    "errors": [...],
-    "counts": {{
-      "total_participants_expected": number,
-      "found_participants": number,
-      "total_events_json": number,
-      "found_messages": number
-    }}
-  }},
-  "usecase_vs_classes": {{
-    "status": "OK" or "ERROR",
-    "errors": [...],
-    "counts": {{
-      "total_usecases": number,
-      "found_methods": number
-    }}
-  }},
-  "classes_vs_sequence": {{
-    "status": "OK" or "ERROR",
-    "errors": [...],
-    "counts": {{
-      "total_lifelines": number,
-      "valid_lifelines": number,
-      "total_messages": number,
-      "valid_messages": number
+  "status": "OK" or "ERROR",
+  "errors": [
+    {{
+      "type": "one of the types above",
+      "element": "element name",
+      "details": "brief description"
     }}
-  }},
-  "overall_status": "OK" or "ERROR"
+  ],
+  "counts": {{
+{counts}
+  }}
 }}
+"""
 
-# ARTIFACTS
-
-JSON:
-{json.dumps(root, indent=2)}
-
-Use case diagram:
-{usecase}
-
-Class diagram:
-{classes}
 
-Sequence diagram:
-{sequence}
+def build_prompt(section_name, root, contents, data_dir="data"):
+    """Prompt completo de uma seção: instruções + os dois artefatos comparados."""
+    names = SECTIONS[section_name]["artifacts"]
+    context = build_context(
+        section_name,
+        root if "root.json" in names else None,
+        {name: contents[name] for name in names if name != "root.json"},
+        data_dir=data_dir,
+    )
+    if "root" in context:
+        context["root.json"] = context.pop("root")
+
+    artifacts = "\n".join(f"{ARTIFACTS[name]}:\n{context[name]}\n" for name in names)
+    return f"""{build_instructions(section_name)}
+# ARTIFACTS
 
+{artifacts}
 Return ONLY the JSON. No markdown, no code fences.
 """
 
-output = call_llm(prompt)
-
-# Salvar verificação bruta
-with open("data/report.json", "w") as f:
-    f.write(output)
 
-# Calcular scores e gerar relatório completo
-verification_result = json.loads(output)
-generate_report(verification_result, "data/score_report.json")
\ No newline at end of file
+def run(data_dir="data", model=None):
+    model = (model or PipelineModel()).ensure(data_dir, *ARTIFACT_FILES)
+
+    contents = {ARTIFACT_FILES[name]: model.sources[name] for name in ARTIFACT_FILES}
+    hashes = {name: content_hash(text) for name, text in contents.items()}
+    root = model.root.to_dict()
+
+    cache_path = os.path.join(data_dir, CACHE_FILE)
+    cache = load_cache(cache_path)
+    verification_result = {}
+    # Modelo e modo de contexto mudam o veredito: entram na chave do cache
+    settings = {"model": resolve_model(), "full_context": FULL_CONTEXT}
+
+    missing = {}
+    for section_name, section in SECTIONS.items():
+        deps = {name: hashes[name] for name in section["artifacts"]}
+        key = section_key(deps, build_instructions(section_name), settings)
+
+        cached = cache.get(section_name)
+        if cached and cached.get("key") == key:
+            print(f"[CACHE] {section_name} reused (artifacts unchanged)")
+            verification_result[section_name] = cached["result"]
+        else:
+            missing[section_name] = (key, deps)
+
+    pending = []
+    if missing:
+        print(f"[VERIFY] {', '.join(missing)} ...")
+        prompts = {name: build_prompt(name, root, contents, data_dir) for name in missing}
+        # As seções são independentes: todas são enviadas em paralelo
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(missing))) as executor:
+            futures = {
+                name: executor.submit(
+                    contextvars.copy_context().run, call_llm_to_file, prompts[name],
+                    stage=f"verify.{name}", validate=validate_json, metrics_dir=data_dir,
+                )
+                for name in missing
+            }
+            for section_name, future in futures.items():
+                try:
+                    output = future.result()
+                except BatchPending:
+                    # Modo batch: as demais seções também entram no mesmo batch
+                    pending.append(section_name)
+                    continue
+                result = json.loads(output)
+
+                key, deps = missing[section_name]
+                verification_result[section_name] = result
+                cache[section_name] = {"key": key, "artifacts": deps, "result": result}
+                # Salva a cada seção para não perder o trabalho já feito em caso de falha
+                save_cache(cache, cache_path)
+
+    if pending:
+        raise BatchPending(f"verify: {len(pending)} section(s) waiting for the batch")
+
+    # Erros determinísticos: recalculados a cada execução (custo de milissegundos)
+    for section_name, errors in local_errors(model).items():
+        section = dict(verification_result[section_name])
+        section["errors"] = list(section.get("errors", [])) + errors
+        if errors:
+            section["status"] = "ERROR"
+        verification_result[section_name] = section
+
+    verification_result["overall_status"] = (
+        "ERROR"
+        if any(verification_result[s].get("status") == "ERROR" for s in SECTIONS)
+        else "OK"
+    )
+
+    # Salvar verificação consolidada
+    with open(os.path.join(data_dir, "report.json"), "w") as f:
+        json.dump(verification_result, f, indent=2, ensure_ascii=False)
+
+    # Calcular scores e gerar relatório completo
+    model.report = generate_report(verification_result, os.path.join(data_dir, "score_report.json"))
+
+    return model
+
+
+if __name__ == "__main__":
+    run()
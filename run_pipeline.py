@@ -1,6 +1,12 @@
+import argparse
+import hashlib
+import json
+import os
 import subprocess
 import sys
+import time
 from pipeline.render import render_with_kroki
+from pipeline.profiling import DEFAULT_DIR as PROFILE_DIR, SPAWN_ENV, profile_stage, write_summary
 
 
 PIPELINE_SCRIPTS = [
@@ -11,39 +17,258 @@ PIPELINE_SCRIPTS = [
     "pipeline/verify.py"
 ]
 
-def run_script(path: str):
+RESCORE_SCRIPT = "pipeline/rescore.py"
+
+DIAGRAMS = [
+    ("data/usecase.puml", "diagrams/usecase.png"),
+    ("data/classes.puml", "diagrams/classes.png"),
+    ("data/sequence.puml", "diagrams/sequence.png")
+]
+
+# Modo --watch: arquivo observado -> primeira etapa afetada por uma mudança nele.
+# "rescore" significa apenas recalcular scores e relatórios (sem LLM).
+WATCH_TARGETS = {
+    "data/study_case.txt": "pipeline/extractor.py",
+    "pipeline/utils.py": "pipeline/extractor.py",
+    "pipeline/budget.py": "pipeline/extractor.py",
+    "pipeline/routing.py": "pipeline/extractor.py",
+    "pipeline/extractor.py": "pipeline/extractor.py",
+    "pipeline/context.py": "pipeline/usecase.py",
+    "pipeline/model.py": "pipeline/usecase.py",
+    "pipeline/delta.py": "pipeline/usecase.py",
+    "pipeline/usecase.py": "pipeline/usecase.py",
+    "pipeline/classes.py": "pipeline/classes.py",
+    "pipeline/sequence.py": "pipeline/sequence.py",
+    "pipeline/cache.py": "pipeline/verify.py",
+    "pipeline/flow_check.py": "pipeline/verify.py",
+    "pipeline/verify.py": "pipeline/verify.py",
+    "pipeline/scoring.py": "rescore",
+    "pipeline/report_generator.py": "rescore",
+}
+
+WATCH_INTERVAL = 0.5  # segundos entre verificações de alteração
+WATCH_DEBOUNCE = 1.0  # segundos sem novas alterações antes de re-executar
+
+def stage_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+def run_script(path: str, exit_on_error: bool = True, profile_dir: str = None) -> bool:
     print(f"\n[RUNNING] {path} ...")
-    result = subprocess.run([sys.executable, path], capture_output=True, text=True)
+    command = [sys.executable, path]
+    env = None
+    if profile_dir:
+        # O filho executa o script sob profiling e mede a própria inicialização
+        command = [sys.executable, "pipeline/profiling.py", path, profile_dir, stage_name(path)]
+        env = {**os.environ, SPAWN_ENV: repr(time.time())}
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
 
     if result.returncode != 0:
         print(f"[ERROR] An error occurred while executing {path}:")
         print(result.stderr)
-        sys.exit(1)
-    
+        if exit_on_error:
+            sys.exit(1)
+        return False
+
     print(f"[OK] {path} completed successfully.")
+    return True
 
-def render_all_diagrams():
-    print("\n=== Rendering UML diagrams via Kroki ===")
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline")
 
-    diagrams = [
-        ("data/usecase.puml", "diagrams/usecase.png"),
-        ("data/classes.puml", "diagrams/classes.png"),
-        ("data/sequence.puml", "diagrams/sequence.png")
-    ]
+def unload_pipeline_modules():
+    """Remove os módulos das etapas já importados, para que a próxima importação leia o código atual."""
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if name != "__main__" and os.path.dirname(os.path.abspath(path)) == PIPELINE_DIR and "." not in name:
+            del sys.modules[name]
+
+def run_in_process(profile_dir=None, route=False, start=None, exit_on_error=True):
+    # As etapas importam seus módulos irmãos pelo nome (ex.: "from utils import call_llm")
+    if PIPELINE_DIR not in sys.path:
+        sys.path.insert(0, PIPELINE_DIR)
+    from runner import run_stages
+    from routing import Router
+
+    def on_event(event):
+        if event["status"] == "running":
+            print(f"\n[RUNNING] {event['stage']} (in-process) ...")
+        else:
+            print(f"[OK] {event['stage']} completed successfully.")
+
+    wrap = None
+    if profile_dir:
+        wrap = lambda name, func: profile_stage(name, func, profile_dir)  # noqa: E731
+
+    # Os artefatos interpretados são passados de uma etapa para a próxima
+    try:
+        run_stages("data", on_event=on_event, router=Router() if route else None, wrap=wrap, start=start)
+    except Exception as e:
+        print(f"[ERROR] An error occurred while executing the pipeline: {e}")
+        if exit_on_error:
+            sys.exit(1)
+        return False
+    return True
+
+def render_all_diagrams(diagrams=DIAGRAMS, exit_on_error=True):
+    print("\n=== Rendering UML diagrams via Kroki ===")
 
     for src, dst in diagrams:
         try:
             render_with_kroki(src, dst)
         except Exception as e:
             print(f"[ERROR] Failed to render {src}: {e}")
-            sys.exit(1)
+            if exit_on_error:
+                sys.exit(1)
+            return False
+    return True
+
+def file_signature(path):
+    """Hash do conteúdo de um arquivo (None se não existir)."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def snapshot(paths):
+    return {path: file_signature(path) for path in paths}
+
+def print_score_summary():
+    try:
+        with open("data/score_report.json", encoding="utf-8") as f:
+            scoring = json.load(f)["scoring"]
+    except (OSError, ValueError, KeyError):
+        return
+    print(f"\n[SCORE] {scoring['overall_score']}/100 - Nota: {scoring['grade']}")
+    for section, data in scoring["section_scores"].items():
+        print(f"  {section}: {data['score']}/100 ({data['error_count']} erros)")
+
+def run_incremental(changed, in_process=False, profile_dir=None, route=False):
+    """
+    Re-executa apenas as etapas afetadas pelos arquivos alterados,
+    com as mesmas opções (--in-process, --profile, --route) da execução inicial.
+    """
+    targets = {WATCH_TARGETS[path] for path in changed}
+    print(f"\n=== CHANGE DETECTED: {', '.join(sorted(changed))} ===")
+    started = time.time()
+
+    stage_targets = [t for t in targets if t != "rescore"]
+    if stage_targets:
+        first = min(PIPELINE_SCRIPTS.index(t) for t in stage_targets)
+        diagrams_before = snapshot(src for src, _ in DIAGRAMS)
+
+        if in_process or route:
+            # O código das etapas pode ter mudado: os módulos são importados de novo
+            unload_pipeline_modules()
+            if not run_in_process(profile_dir, route, start=stage_name(PIPELINE_SCRIPTS[first]),
+                                  exit_on_error=False):
+                return
+        else:
+            for script in PIPELINE_SCRIPTS[first:]:
+                if not run_script(script, exit_on_error=False, profile_dir=profile_dir):
+                    return
+
+        # Renderiza somente os diagramas cujo conteúdo mudou
+        diagrams_after = snapshot(src for src, _ in DIAGRAMS)
+        changed_diagrams = [
+            (src, dst) for src, dst in DIAGRAMS
+            if diagrams_before[src] != diagrams_after[src]
+        ]
+        if changed_diagrams:
+            render_all_diagrams(changed_diagrams, exit_on_error=False)
+        if profile_dir:
+            write_summary([stage_name(script) for script in PIPELINE_SCRIPTS] + ["render"], profile_dir)
+    else:
+        if not run_script(RESCORE_SCRIPT, exit_on_error=False):
+            return
+
+    print_score_summary()
+    print(f"\n=== UPDATED IN {time.time() - started:.1f}s - watching for changes ===")
+
+def stale_inputs(paths, report="data/score_report.json"):
+    """Arquivos observados alterados depois do último relatório (ex.: editados com o watch parado)."""
+    try:
+        report_time = os.path.getmtime(report)
+    except OSError:
+        return set(paths)
+    return {path for path in paths if os.path.getmtime(path) > report_time}
+
+def watch(in_process=False, profile_dir=None, route=False, pending=None):
+    """
+    Observa as entradas e re-executa as etapas afetadas.
+    `pending` são alterações já conhecidas, processadas antes de começar a observar.
+    """
+    paths = [path for path in WATCH_TARGETS if os.path.exists(path)]
+    options = {"in_process": in_process, "profile_dir": profile_dir, "route": route}
+    print("\n=== WATCH MODE ===")
+    print("Watching:")
+    for path in paths:
+        print(f"- {path}")
+    print("Press Ctrl+C to stop.")
+
+    state = snapshot(paths)
+    pending = set(pending or ())
+    last_change = 0.0
+
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            current = snapshot(paths)
+            changed = {path for path in paths if current[path] != state[path]}
+            if changed:
+                pending |= changed
+                last_change = time.time()
+                state = current
+
+            # Debounce: espera uma pausa nas edições antes de re-executar
+            if pending and time.time() - last_change >= WATCH_DEBOUNCE:
+                batch, pending = pending, set()
+                run_incremental(batch, **options)
+                # Alterações feitas durante a execução são detectadas na próxima iteração
+    except KeyboardInterrupt:
+        print("\n=== WATCH MODE STOPPED ===")
 
 def main():
+    parser = argparse.ArgumentParser(description="UML generation and verification pipeline")
+    parser.add_argument("--watch", action="store_true",
+                        help="after the full run, re-run affected stages whenever inputs change")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run all stages in this process instead of one subprocess per stage")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                        help=f"profile every stage (cProfile + stack sampling) into DIR (default: {PROFILE_DIR})")
+    parser.add_argument("--route", action="store_true",
+                        help="cost-aware model routing with escalation (implies --in-process)")
+    parser.add_argument("--delta", action="store_true",
+                        help="patch existing diagrams when root.json changes slightly instead of regenerating them")
+    parser.add_argument("--chunked", action="store_true",
+                        help="extract the study case in parallel chunks (map-reduce), even if it is short")
+    args = parser.parse_args()
+
+    # As etapas (inclusive em subprocessos) leem os modos incremental e map-reduce do ambiente
+    if args.delta:
+        os.environ["UML_DELTA"] = "1"
+    if args.chunked:
+        os.environ["UML_CHUNKED"] = "1"
+
+    watch_options = {"in_process": args.in_process, "profile_dir": args.profile, "route": args.route}
+
+    # Com --watch, artefatos de uma execução anterior são reaproveitados;
+    # entradas editadas depois do último relatório são re-executadas primeiro
+    if args.watch and os.path.exists("data/score_report.json"):
+        print("\n=== REUSING EXISTING ARTIFACTS ===")
+        stale = stale_inputs([path for path in WATCH_TARGETS if os.path.exists(path)])
+        if stale:
+            print(f"Changed since the last run: {', '.join(sorted(stale))}")
+        watch(pending=stale, **watch_options)
+        return
+
     print("\n=== STARTING UML PIPELINE ===")
 
     # Executa cada etapa
-    for script in PIPELINE_SCRIPTS:
-        run_script(script)
+    if args.in_process or args.route:
+        run_in_process(args.profile, args.route)
+    else:
+        for script in PIPELINE_SCRIPTS:
+            run_script(script, profile_dir=args.profile)
 
     print("\n=== PIPELINE EXECUTION FINISHED SUCCESSFULLY ===")
     print("Generated outputs in /data:")
@@ -54,7 +279,12 @@ def main():
     print("- verify.json")
 
     # Renderização das imagens PNG via Kroki
-    render_all_diagrams()
+    if args.profile:
+        profile_stage("render", render_all_diagrams, args.profile)
+        stages = [stage_name(script) for script in PIPELINE_SCRIPTS] + ["render"]
+        write_summary(stages, args.profile)
+    else:
+        render_all_diagrams()
 
     print("\n=== ALL DIAGRAM PNG FILES GENERATED SUCCESSFULLY ===")
     print("Files available in /data:")
@@ -62,5 +292,8 @@ def main():
     print("- classes.png")
     print("- sequence.png")
 
+    if args.watch:
+        watch(**watch_options)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Serviço HTTP local que expõe o pipeline UML como jobs assíncronos.
+Os clientes da LLM e do Kroki ficam aquecidos no processo e os jobs rodam
+em um pool limitado de workers, cada um em seu próprio diretório (jobs/<id>).
+O estado de cada job fica em jobs/<id>/job.json: jobs antigos saem da memória
+e são relidos do disco quando consultados, inclusive após reiniciar o serviço.
+
+Uso: python3 serve.py [--host 127.0.0.1] [--port 8000] [--workers 2]
+
+Endpoints:
+  POST /jobs                          envia um estudo de caso (texto puro ou JSON {"study_case": "..."})
+                                      ?route=1 ou {"route": true} ativa o roteamento de modelos
+  GET  /jobs                          lista os jobs
+  GET  /jobs/<id>                     status e progresso por etapa
+  GET  /jobs/<id>/events              progresso em tempo real (server-sent events)
+  GET  /jobs/<id>/artifacts/<nome>    score_report.json, score_report.txt, root.json, *.puml, *.png ...
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import re
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline"))
+from runner import run_pipeline  # noqa: E402
+from routing import Router  # noqa: E402
+
+
+JOBS_DIR = "jobs"
+JOB_FILE = "job.json"
+JOB_ID = re.compile(r"^[0-9a-f]{12}$")
+# Jobs aguardando ou em execução além deste limite são recusados com HTTP 429
+MAX_PENDING = 32
+# Jobs concluídos mantidos em memória; os mais antigos são relidos de jobs/<id> quando pedidos
+MAX_FINISHED_IN_MEMORY = 256
+
+# Artefatos disponíveis para download: nome -> (subdiretório do job, content-type)
+ARTIFACTS = {
+    "root.json": ("data", "application/json"),
+    "usecase.puml": ("data", "text/plain; charset=utf-8"),
+    "classes.puml": ("data", "text/plain; charset=utf-8"),
+    "sequence.puml": ("data", "text/plain; charset=utf-8"),
+    "report.json": ("data", "application/json"),
+    "score_report.json": ("data", "application/json"),
+    "score_report.txt": ("data", "text/plain; charset=utf-8"),
+    "routing_report.json": ("data", "application/json"),
+    "usecase.png": ("diagrams", "image/png"),
+    "classes.png": ("diagrams", "image/png"),
+    "sequence.png": ("diagrams", "image/png"),
+}
+
+
+class Job:
+    def __init__(self, job_id, job_dir, route=False):
+        self.id = job_id
+        self.dir = job_dir
+        self.route = route
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.events = []
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def emit(self, event):
+        with self.condition:
+            self.events.append({**event, "time": round(time.time() - self.created, 3)})
+            self.condition.notify_all()
+
+    def set_status(self, status, error=None):
+        with self.condition:
+            self.status = status
+            self.error = error
+        self.emit({"stage": "job", "status": status, **({"error": error} if error else {})})
+        self.save()
+
+    def save(self):
+        """Grava o estado do job em jobs/<id>/job.json (usado ao reiniciar o serviço)."""
+        with self.condition:
+            state = {"job_id": self.id, "status": self.status, "error": self.error,
+                     "route": self.route, "created": self.created, "events": list(self.events)}
+        path = os.path.join(self.dir, JOB_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, job_id):
+        """Job gravado em disco, ou None. Jobs interrompidos por um reinício ficam como falhos."""
+        if not JOB_ID.match(job_id):
+            return None
+        try:
+            with open(os.path.join(JOBS_DIR, job_id, JOB_FILE), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(job_id, os.path.join(JOBS_DIR, job_id), state.get("route", False))
+        job.created = state.get("created", job.created)
+        job.events = state.get("events", [])
+        job.status, job.error = state.get("status", "failed"), state.get("error")
+        if not job.finished:
+            job.status, job.error = "failed", "interrupted by a service restart"
+        return job
+
+    def summary(self):
+        with self.condition:
+            stages = {}
+            for event in self.events:
+                if event["stage"] != "job":
+                    stages[event["stage"]] = {k: v for k, v in event.items() if k != "stage"}
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "stages": stages,
+                "artifacts": [
+                    name for name, (sub, _) in ARTIFACTS.items()
+                    if os.path.exists(os.path.join(self.dir, sub, name))
+                ],
+            }
+
+
+jobs = {}
+jobs_lock = threading.Lock()
+executor = None
+
+
+def evict_finished():
+    """Mantém em memória no máximo MAX_FINISHED_IN_MEMORY jobs concluídos (chamar com jobs_lock)."""
+    finished = sorted((job for job in jobs.values() if job.finished), key=lambda job: job.created)
+    for job in finished[:max(0, len(finished) - MAX_FINISHED_IN_MEMORY)]:
+        del jobs[job.id]
+
+
+def find_job(job_id):
+    """Job em memória ou, se já foi descartado (ou o serviço reiniciou), relido de jobs/<id>."""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            job = Job.load(job_id)
+            if job is not None:
+                jobs[job_id] = job
+                evict_finished()
+        return job
+
+
+def load_jobs():
+    """Recarrega os jobs mais recentes de JOBS_DIR na inicialização."""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    loaded = [job for job in map(Job.load, os.listdir(JOBS_DIR)) if job is not None]
+    with jobs_lock:
+        for job in loaded:
+            jobs[job.id] = job
+        evict_finished()
+    print(f"[JOBS] {len(jobs)} previous job(s) loaded from {JOBS_DIR}/")
+
+
+def run_job(job):
+    job.set_status("running")
+    try:
+        run_pipeline(
+            os.path.join(job.dir, "data"),
+            os.path.join(job.dir, "diagrams"),
+            on_event=job.emit,
+            router=Router() if job.route else None,
+        )
+        job.set_status("done")
+    except Exception as e:
+        traceback.print_exc()
+        job.set_status("failed", f"{type(e).__name__}: {e}")
+
+
+def submit_job(study_case, route=False):
+    with jobs_lock:
+        pending = sum(1 for job in jobs.values() if not job.finished)
+        if pending >= MAX_PENDING:
+            return None
+
+        job_id = uuid.uuid4().hex[:12]
+        job = Job(job_id, os.path.join(JOBS_DIR, job_id), route)
+        jobs[job_id] = job
+        evict_finished()
+
+    os.makedirs(os.path.join(job.dir, "data"), exist_ok=True)
+    os.makedirs(os.path.join(job.dir, "diagrams"), exist_ok=True)
+    with open(os.path.join(job.dir, "data", "study_case.txt"), "w", encoding="utf-8") as f:
+        f.write(study_case)
+
+    job.emit({"stage": "job", "status": "queued"})
+    job.save()
+    executor.submit(run_job, job)
+    return job
+
+
+class PipelineHandler(BaseHTTPRequestHandler):
+    server_version = "UMLPipeline/1.0"
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_job(self, job_id):
+        job = find_job(job_id)
+        if job is None:
+            self.send_json(404, {"error": f"job '{job_id}' not found"})
+        return job
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            return self.send_json(404, {"error": "not found"})
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        query = parse_qs(urlparse(self.path).query)
+        route = query.get("route", ["0"])[-1] in ("1", "true")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                payload = json.loads(body)
+                body = payload.get("study_case", "")
+                route = bool(payload.get("route", route))
+            except (ValueError, AttributeError):
+                return self.send_json(400, {"error": "invalid JSON body"})
+
+        if not body.strip():
+            return self.send_json(400, {"error": "empty study case"})
+
+        job = submit_job(body, route)
+        if job is None:
+            return self.send_json(429, {"error": "too many pending jobs, try again later"})
+
+        self.send_json(202, {
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events",
+        })
+
+    def do_GET(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+
+        if parts == ["jobs"]:
+            with jobs_lock:
+                listing = [{"job_id": j.id, "status": j.status} for j in jobs.values()]
+            return self.send_json(200, listing)
+
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self.send_json(404, {"error": "not found"})
+
+        job = self.get_job(parts[1])
+        if job is None:
+            return
+
+        if len(parts) == 2:
+            return self.send_json(200, job.summary())
+        if parts[2:] == ["events"]:
+            return self.stream_events(job)
+        if len(parts) == 4 and parts[2] == "artifacts":
+            return self.send_artifact(job, parts[3])
+
+        self.send_json(404, {"error": "not found"})
+
+    def send_artifact(self, job, name):
+        if name not in ARTIFACTS:
+            return self.send_json(404, {"error": f"unknown artifact '{name}'"})
+
+        sub, content_type = ARTIFACTS[name]
+        path = os.path.join(job.dir, sub, name)
+        if not os.path.exists(path):
+            return self.send_json(404, {"error": f"artifact '{name}' not available (job {job.status})"})
+
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self, job):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        sent = 0
+        try:
+            while True:
+                with job.condition:
+                    while sent == len(job.events) and not job.finished:
+                        job.condition.wait(timeout=15)
+                        if sent == len(job.events) and not job.finished:
+                            break  # timeout: envia keep-alive
+                    pending = job.events[sent:]
+                    finished = job.finished
+
+                if not pending:
+                    self.wfile.write(b": keep-alive\n\n")
+                for event in pending:
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"event: progress\ndata: {data}\n\n".encode("utf-8"))
+                sent += len(pending)
+                self.wfile.flush()
+
+                if finished and sent == len(job.events):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        print(f"[HTTP] {self.address_string()} {format % args}")
+
+
+def main():
+    global executor
+
+    parser = argparse.ArgumentParser(description="Serve the UML pipeline as asynchronous jobs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="maximum concurrent pipeline runs")
+    args = parser.parse_args()
+
+    load_jobs()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), PipelineHandler)
+    print(f"=== UML PIPELINE SERVICE on http://{args.host}:{args.port} ({args.workers} workers) ===")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n=== SERVICE STOPPED ===")
+    finally:
+        server.server_close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,78 @@
 #!/usr/bin/env python3
 """
 Script para gerar relatório textual a partir de um score_report.json existente.
-Uso: python3 view_report.py [caminho_para_score_report.json]
+Uso: python3 view_report.py [caminho_para_score_report.json] [saida.txt] [--profile [DIR]]
+
+Relatório de uma execução arquivada (ver pipeline/archive.py):
+     python3 view_report.py --archive runs.archive --run <execução> [-o saida.txt]
+
+Modo agregado (muitas execuções; diretórios, score_report.json, .jsonl ou arquivos de execuções):
+     python3 view_report.py --aggregate runs/ extra.jsonl runs.archive [-o data/aggregate_report.txt] [--workers N]
 """
 
+import argparse
+import json
+import os
 import sys
-from pipeline.report_generator import generate_text_report
+
+# Os módulos do pipeline importam seus irmãos pelo nome (ex.: "from archive import Archive")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline"))
+from aggregate import TOP_K, aggregate_reports  # noqa: E402
+from archive import Archive  # noqa: E402
+from report_generator import generate_aggregate_report, generate_text_report  # noqa: E402
+from profiling import DEFAULT_DIR as PROFILE_DIR, profile_stage, write_summary  # noqa: E402
 
 
 def main():
-    # Arquivo padrão
-    report_file = "data/score_report.json"
-    output_file = "data/score_report.txt"
-    
-    # Aceitar arquivo customizado via argumento
-    if len(sys.argv) > 1:
-        report_file = sys.argv[1]
-    
-    if len(sys.argv) > 2:
-        output_file = sys.argv[2]
-    
+    parser = argparse.ArgumentParser(description="Generate the text report from a score_report.json")
+    # Arquivos padrão
+    parser.add_argument("report_file", nargs="?", help="default: data/score_report.json")
+    parser.add_argument("output_file", nargs="?", default="data/score_report.txt")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                        help=f"profile report generation into DIR (default: {PROFILE_DIR})")
+    parser.add_argument("--aggregate", nargs="+", metavar="PATH",
+                        help="aggregate many runs: directories, score_report.json files or .jsonl files")
+    parser.add_argument("-o", "--output",
+                        help="text report to write (default: the output_file argument; with --aggregate, "
+                             "data/aggregate_report.txt, with the JSON summary written next to it)")
+    parser.add_argument("--top", type=int, default=TOP_K, help="number of worst cases to list")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parser processes for large corpora (default: CPU count, 1 disables)")
+    parser.add_argument("--archive", metavar="ARCHIVE", help="read the report of --run from a run archive")
+    parser.add_argument("--run", help="archived run id (with --archive)")
+    args = parser.parse_args()
+
+    if args.aggregate:
+        return aggregate_main(args)
+
+    output_file = args.output or args.output_file
+    report = None
+
+    if args.archive:
+        if not args.run:
+            parser.error("--archive requires --run")
+        if args.report_file:
+            parser.error("report_file cannot be combined with --archive (use -o for the output file)")
+        report_file = f"{args.archive}:{args.run}"
+        try:
+            with Archive(args.archive) as archive:
+                report = archive.read_json(args.run, "score_report.json")
+        except FileNotFoundError as e:
+            print(f"\n✗ Erro: {e}")
+            sys.exit(1)
+        except KeyError as e:
+            print(f"\n✗ Erro: artefato {e} não encontrado no arquivo '{args.archive}'.")
+            sys.exit(1)
+    else:
+        report_file = args.report_file or "data/score_report.json"
+
     try:
-        generate_text_report(report_file, output_file)
+        generate = lambda: generate_text_report(report_file, output_file, report=report)  # noqa: E731
+        if args.profile:
+            profile_stage("report", generate, args.profile)
+            write_summary(["report"], args.profile)
+        else:
+            generate()
         print(f"\n✓ Relatório gerado com sucesso!")
         print(f"  Arquivo: {output_file}")
         print(f"\nPara visualizar o relatório, execute:")
@@ -39,5 +90,25 @@ def main():
         sys.exit(1)
 
 
+def aggregate_main(args):
+    missing = [path for path in args.aggregate if not os.path.exists(path)]
+    if missing:
+        print(f"\n✗ Erro: '{missing[0]}' não encontrado.")
+        sys.exit(1)
+
+    output = args.output or "data/aggregate_report.txt"
+    aggregate = aggregate_reports(args.aggregate, top_k=args.top, workers=args.workers)
+    summary = aggregate.summary()
+
+    summary_file = os.path.splitext(output)[0] + ".json"
+    with open(summary_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    generate_aggregate_report(summary, output)
+
+    print(f"\n✓ {summary['runs']} execuções agregadas ({summary['invalid']} ignoradas)")
+    print(f"  Relatório: {output}")
+    print(f"  Resumo: {summary_file}")
+
+
 if __name__ == "__main__":
     main()